@@ -0,0 +1,158 @@
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from sqlalchemy import text
+
+# SQLSTATE of a statement stopped by statement_timeout or a cancel request
+QUERY_CANCELED = '57014'
+
+
+class Censored(Exception):
+    """A cell that was not measured: 'predicted' not to finish in the time left, or stopped at a 'timeout'."""
+
+    def __init__(self, reason: str, detail: str, predicted_ms: float = None, elapsed_s: float = None):
+        super().__init__(detail)
+        self.reason = reason
+        self.predicted_ms = predicted_ms
+        self.elapsed_s = elapsed_s
+
+    def context(self) -> dict:
+        return {'censored': self.reason, 'predicted_ms': self.predicted_ms, 'elapsed_s': self.elapsed_s}
+
+
+@contextmanager
+def deadline(connection, seconds: float):
+    """Stops whatever the connection runs after seconds, on the server and from the client.
+
+    statement_timeout ends a single long statement even if the client is
+    stuck; the client-side cancel also ends a series of statements that
+    are each short but together run past the deadline. Yields an Event
+    that is set once the cancel has been sent.
+    """
+    postgres = connection.dialect.name == 'postgresql'
+    driver_connection = connection.connection.driver_connection
+    fired = threading.Event()
+
+    def cancel():
+        fired.set()
+        # psycopg2 cancels the running statement; sqlite3 and duckdb interrupt it
+        (driver_connection.cancel if postgres else driver_connection.interrupt)()
+
+    if postgres:
+        connection.execute(text("SELECT set_config('statement_timeout', :timeout, false)"),
+                           {'timeout': str(max(int(seconds * 1000), 1))})
+    timer = threading.Timer(seconds, cancel)
+    timer.daemon = True
+    timer.start()
+    try:
+        yield fired
+    finally:
+        timer.cancel()
+        if postgres:
+            # Committed, since the measurement may have committed the timeout and a later rollback would restore it
+            connection.execute(text("RESET statement_timeout"))
+            connection.commit()
+
+
+def cancelled(error: Exception, fired: threading.Event) -> bool:
+    original = getattr(error, 'orig', error)
+    return fired.is_set() or getattr(original, 'pgcode', None) == QUERY_CANCELED
+
+
+@dataclass
+class RuntimeBudget:
+    """Bounds the time each scenario of a run may spend measuring, so a sweep finishes in bounded time.
+
+    Per-run times measured at smaller sizes predict the time at the next
+    size: a power law once two sizes are known, linear growth from one.
+    Cells predicted not to finish in what is left of their scenario's
+    budget are not started, and cells that run out of it are cancelled.
+    Once a cell has timed out, it is not tried again at larger sizes.
+    Both kinds are censored: recorded without a measurement.
+    """
+    scenario_seconds: float = 600.0
+    # Cell key -> {size: median ms per run}
+    history: dict = field(default_factory=dict)
+    # Cell key -> smallest size it timed out at
+    timed_out: dict = field(default_factory=dict)
+    censored: list = field(default_factory=list)
+
+    def scenario(self) -> 'ScenarioBudget':
+        """Starts the clock of a scenario."""
+        return ScenarioBudget(self, time.monotonic() + self.scenario_seconds)
+
+    def observe(self, key: str, size: int, median_ms: float):
+        self.history.setdefault(key, {})[size] = median_ms
+
+    def predict_ms(self, key: str, size: int) -> float:
+        """Expected ms per run of the cell at size, from the smaller sizes measured so far, or None."""
+        points = sorted((known, median_ms) for known, median_ms in self.history.get(key, {}).items() if known < size)
+        if not points:
+            return None
+        if len(points) == 1:
+            known, median_ms = points[0]
+            return median_ms * size / known
+        from scaling_sweep import fit_power_law
+        # Never predict faster than linear growth from the largest size measured
+        fit = fit_power_law(key, [known for known, _ in points], [median_ms for _, median_ms in points])
+        known, median_ms = points[-1]
+        return max(fit.predict_ms(size), median_ms * size / known)
+
+    def report(self) -> str:
+        lines = [f"Censored {len(self.censored)} cells (budget {self.scenario_seconds:.0f} s per scenario)"]
+        lines.extend(f"  {key}: {censored}" for key, censored in self.censored)
+        return "\n".join(lines)
+
+
+class ScenarioBudget:
+    def __init__(self, budget: RuntimeBudget, deadline_at: float):
+        self.budget = budget
+        self.deadline_at = deadline_at
+
+    def remaining(self) -> float:
+        return self.deadline_at - time.monotonic()
+
+    def check(self, key: str, size: int, runs: int):
+        """Raises Censored when the cell can't be expected to finish in the time left."""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise Censored('predicted', "scenario budget spent")
+        timed_out_at = self.budget.timed_out.get(key)
+        if timed_out_at is not None and size >= timed_out_at:
+            raise Censored('predicted', f"timed out at the smaller size {timed_out_at}")
+        predicted_ms = self.budget.predict_ms(key, size)
+        if predicted_ms is not None and predicted_ms * runs / 1000 > remaining:
+            raise Censored('predicted', f"predicted {predicted_ms * runs / 1000:.1f} s for {runs} runs, "
+                                        f"{remaining:.1f} s left", predicted_ms=predicted_ms)
+
+    def run(self, connection, key: str, size: int, runs: int, measure):
+        """Calls measure(), which returns (measurement, plan), within the budget; raises Censored instead.
+
+        Earlier work on the connection, such as join method settings and new
+        indexes, is committed first, so that rolling back a cancelled cell
+        undoes only the cell's own statements.
+        """
+        try:
+            self.check(key, size, runs)
+        except Censored as censored:
+            self.budget.censored.append((f"{key} at {size}", censored))
+            raise
+        connection.commit()
+        start_time = time.perf_counter()
+        with deadline(connection, self.remaining()) as fired:
+            try:
+                measurement, plan = measure()
+            except Exception as error:
+                connection.rollback()
+                if not cancelled(error, fired):
+                    raise
+                elapsed = time.perf_counter() - start_time
+                self.budget.timed_out[key] = min(size, self.budget.timed_out.get(key, size))
+                censored = Censored('timeout', f"cancelled after {elapsed:.1f} s, the rest of the scenario budget",
+                                    elapsed_s=elapsed)
+                self.budget.censored.append((f"{key} at {size}", censored))
+                raise censored from None
+        self.budget.observe(key, size, measurement.median_ms)
+        return measurement, plan
@@ -0,0 +1,215 @@
+import csv
+import io
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+TABLE_SCHEMAS = {
+    'employees': [
+        ('emp_id', 'integer'),
+        ('first_name', 'text'),
+        ('last_name', 'text'),
+        ('department_id', 'integer'),
+        ('salary', 'double precision'),
+        ('hire_date', 'date'),
+    ],
+    'departments': [
+        ('dept_id', 'integer'),
+        ('dept_name', 'text'),
+        ('location', 'text'),
+        ('budget', 'double precision'),
+    ],
+}
+
+COPY_FORMATS = ('text', 'binary')
+
+PGCOPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + b'\x00\x00\x00\x00' + b'\x00\x00\x00\x00'
+PGCOPY_TRAILER = b'\xff\xff'
+PG_EPOCH = np.datetime64('2000-01-01', 'D')
+FIXED_WIDTH_TYPES = {
+    'integer': '>i4',
+    'bigint': '>i8',
+    'double precision': '>f8',
+    'date': '>i4',
+}
+
+
+@dataclass
+class LoadStats:
+    table: str
+    rows: int
+    bytes: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else float('inf')
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.bytes / 1e6 / self.seconds if self.seconds else float('inf')
+
+    def __str__(self):
+        return (f"{self.table}: {self.rows} rows, {self.bytes / 1e6:.2f} MB in {self.seconds:.3f} s "
+                f"({self.rows_per_second:,.0f} rows/s, {self.mb_per_second:.2f} MB/s)")
+
+
+def _encode_column(series: pd.Series, pg_type: str):
+    """Returns (lengths, payload) for one column of a binary COPY stream.
+
+    lengths is -1 for NULLs; payload is a (rows, width) matrix for fixed-width
+    types and a flat byte array of the non-NULL values otherwise.
+    """
+    nulls = series.isna().to_numpy()
+    if pg_type in FIXED_WIDTH_TYPES:
+        dtype = np.dtype(FIXED_WIDTH_TYPES[pg_type])
+        if pg_type == 'date':
+            days = series.to_numpy(dtype='datetime64[D]') - PG_EPOCH
+            values = np.where(nulls, 0, days.astype(np.int64))
+        else:
+            values = series.to_numpy(dtype=np.float64 if dtype.kind == 'f' else np.int64, na_value=0)
+        values = values.astype(dtype)
+        lengths = np.where(nulls, -1, dtype.itemsize).astype(np.int64)
+        return lengths, values.view(np.uint8).reshape(-1, dtype.itemsize)
+
+    if pg_type == 'text':
+        encoded = [value.encode('utf-8') for value in series[~nulls]]
+    elif pg_type == 'bytea':
+        encoded = [bytes(value) for value in series[~nulls]]
+    else:
+        raise ValueError(f"No binary COPY encoder for type {pg_type!r}")
+    lengths = np.full(len(series), -1, dtype=np.int64)
+    lengths[~nulls] = [len(value) for value in encoded]
+    return lengths, np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+
+def encode_binary(df: pd.DataFrame, columns: list, header: bool = True, trailer: bool = True) -> bytes:
+    """Encodes a DataFrame as PostgreSQL binary COPY data without a per-row Python loop."""
+    num_rows = len(df)
+    encoded = [_encode_column(df[name], pg_type) for name, pg_type in columns]
+
+    # Every tuple is a 2-byte field count followed by (4-byte length, data) per field
+    row_sizes = np.full(num_rows, 2, dtype=np.int64)
+    for lengths, _ in encoded:
+        row_sizes += 4 + np.maximum(lengths, 0)
+    prefix = PGCOPY_HEADER if header else b''
+    row_starts = len(prefix) + np.concatenate(([0], np.cumsum(row_sizes)[:-1])) if num_rows else np.zeros(0, np.int64)
+
+    total = len(prefix) + int(row_sizes.sum()) + (len(PGCOPY_TRAILER) if trailer else 0)
+    buf = np.zeros(total, dtype=np.uint8)
+    buf[:len(prefix)] = np.frombuffer(prefix, dtype=np.uint8)
+    if trailer:
+        buf[-2:] = 0xff
+
+    field_count = np.frombuffer(np.array(len(columns), dtype='>i2').tobytes(), dtype=np.uint8)
+    buf[row_starts[:, None] + np.arange(2)] = field_count
+    cursor = row_starts + 2
+    for lengths, payload in encoded:
+        length_bytes = lengths.astype('>i4').view(np.uint8).reshape(-1, 4)
+        buf[cursor[:, None] + np.arange(4)] = length_bytes
+        cursor = cursor + 4
+        valid = lengths >= 0
+        if payload.ndim == 2:
+            width = payload.shape[1]
+            buf[cursor[valid][:, None] + np.arange(width)] = payload[valid]
+        elif payload.size:
+            valid_lengths = lengths[valid]
+            value_starts = np.concatenate(([0], np.cumsum(valid_lengths)[:-1]))
+            positions = np.repeat(cursor[valid] - value_starts, valid_lengths) + np.arange(payload.size)
+            buf[positions] = payload
+        cursor = cursor + np.maximum(lengths, 0)
+    return buf.tobytes()
+
+
+def encode_text(df: pd.DataFrame, columns: list) -> bytes:
+    """Encodes a DataFrame in PostgreSQL's tab-separated COPY text format."""
+    escaped = {}
+    for name, pg_type in columns:
+        series = df[name]
+        if pg_type == 'bytea':
+            series = series.map(lambda value: value if value is None else '\\x' + bytes(value).hex(), na_action='ignore')
+        if pg_type in ('text', 'bytea'):
+            series = (series.str.replace('\\', '\\\\', regex=False)
+                      .str.replace('\t', '\\t', regex=False)
+                      .str.replace('\n', '\\n', regex=False)
+                      .str.replace('\r', '\\r', regex=False))
+        elif pg_type == 'integer' or pg_type == 'bigint':
+            series = series.astype('Int64')
+        escaped[name] = series
+    return pd.DataFrame(escaped).to_csv(sep='\t', header=False, index=False, na_rep='\\N',
+                                        date_format='%Y-%m-%d', quoting=csv.QUOTE_NONE).encode('utf-8')
+
+
+class BulkLoader:
+    """Creates the benchmark tables with explicit types and fills them through COPY FROM STDIN."""
+
+    def __init__(self, engine, copy_format: str = 'binary', unlogged: bool = False, verbose: bool = True):
+        if copy_format not in COPY_FORMATS:
+            raise ValueError(f"copy_format must be one of {COPY_FORMATS}, got {copy_format!r}")
+        self.engine = engine
+        self.copy_format = copy_format
+        self.unlogged = unlogged
+        self.verbose = verbose
+
+    def create_table(self, cursor, table: str, columns: list):
+        column_defs = ", ".join(f"{name} {pg_type}" for name, pg_type in columns)
+        unlogged = "UNLOGGED " if self.unlogged else ""
+        cursor.execute(f"DROP TABLE IF EXISTS {table} CASCADE")
+        cursor.execute(f"CREATE {unlogged}TABLE {table} ({column_defs})")
+
+    def encode(self, df: pd.DataFrame, columns: list, header: bool = True, trailer: bool = True) -> bytes:
+        if self.copy_format == 'binary':
+            return encode_binary(df, columns, header=header, trailer=trailer)
+        return encode_text(df, columns)
+
+    def copy_statement(self, table: str, columns: list) -> str:
+        column_names = ", ".join(name for name, _ in columns)
+        return f"COPY {table} ({column_names}) FROM STDIN WITH (FORMAT {self.copy_format})"
+
+    def copy_dataframe(self, cursor, table: str, df: pd.DataFrame, columns: list) -> int:
+        payload = self.encode(df, columns)
+        cursor.copy_expert(self.copy_statement(table, columns), io.BytesIO(payload))
+        return len(payload)
+
+    def load_table(self, cursor, table: str, df: pd.DataFrame, columns: list = None) -> LoadStats:
+        columns = columns or TABLE_SCHEMAS[table]
+        start_time = time.perf_counter()
+        self.create_table(cursor, table, columns)
+        num_bytes = self.copy_dataframe(cursor, table, df, columns)
+        return LoadStats(table, len(df), num_bytes, time.perf_counter() - start_time)
+
+    def analyze(self, tables: list):
+        raw_connection = self.engine.raw_connection()
+        try:
+            raw_connection.autocommit = True
+            with raw_connection.cursor() as cursor:
+                for table in tables:
+                    cursor.execute(f"ANALYZE {table}")
+        finally:
+            raw_connection.autocommit = False
+            raw_connection.close()
+
+    def load(self, employees_df: pd.DataFrame, departments_df: pd.DataFrame) -> list:
+        raw_connection = self.engine.raw_connection()
+        try:
+            with raw_connection.cursor() as cursor:
+                stats = [
+                    self.load_table(cursor, 'departments', departments_df),
+                    self.load_table(cursor, 'employees', employees_df),
+                ]
+            raw_connection.commit()
+        finally:
+            raw_connection.close()
+
+        # The join plans are only meaningful once the planner has statistics
+        start_time = time.perf_counter()
+        self.analyze(['departments', 'employees'])
+        analyze_seconds = time.perf_counter() - start_time
+
+        if self.verbose:
+            for load_stats in stats:
+                print(f"Loaded {load_stats}")
+            print(f"ANALYZE took {analyze_seconds:.3f} s")
+        return stats
@@ -0,0 +1,243 @@
+import datetime
+from dataclasses import dataclass, fields
+
+NAME_POOL_SIZE = 1000
+DEFAULT_CHUNK_SIZE = 100_000
+HIRE_DATE_YEARS = 10
+# Hire dates end here rather than on the day of the run, so a seed always gives the same rows
+REFERENCE_DATE = datetime.date(2024, 1, 1)
+# Bump whenever a change alters the rows produced for a given seed
+GENERATOR_VERSION = 2
+
+SKEWS = ('uniform', 'zipf', 'hot')
+ORDERS = ('random', 'sorted')
+
+
+@dataclass(frozen=True)
+class Distribution:
+    """Shape of employees.department_id and width of the employee rows.
+
+    skew       - 'uniform', 'zipf' (P(k) ∝ k^-zipf_exponent over the department ids)
+                 or 'hot' (hot_fraction of rows on the first hot_keys ids, the rest uniform)
+    dangling   - fraction of rows pointing at ids that have no department
+    nulls      - fraction of rows with a NULL department_id
+    payload    - widths of extra random text/bytea columns appended to employees
+    order      - 'sorted' stores employees physically ordered by department_id
+    """
+    skew: str = 'uniform'
+    zipf_exponent: float = 1.1
+    hot_keys: int = 1
+    hot_fraction: float = 0.5
+    dangling_fraction: float = 0.0
+    null_fraction: float = 0.0
+    payload_text_bytes: int = 0
+    payload_bytea_bytes: int = 0
+    order: str = 'random'
+
+    def __post_init__(self):
+        if self.skew not in SKEWS:
+            raise ValueError(f"skew must be one of {SKEWS}, got {self.skew!r}")
+        if self.order not in ORDERS:
+            raise ValueError(f"order must be one of {ORDERS}, got {self.order!r}")
+        for name in ('hot_fraction', 'dangling_fraction', 'null_fraction'):
+            if not 0.0 <= getattr(self, name) <= 1.0:
+                raise ValueError(f"{name} must be between 0 and 1")
+
+    def changes(self) -> dict:
+        """Fields that differ from the default and actually affect the generated rows."""
+        changed = {item.name: getattr(self, item.name) for item in fields(self)
+                   if getattr(self, item.name) != item.default}
+        if self.skew != 'zipf':
+            changed.pop('zipf_exponent', None)
+        if self.skew != 'hot':
+            changed.pop('hot_keys', None)
+            changed.pop('hot_fraction', None)
+        return changed
+
+    def label(self) -> str:
+        return ",".join(f"{name}={value}" for name, value in self.changes().items()) or "uniform"
+
+
+class DataGenerator:
+    """Builds the employees/departments tables column-wise with NumPy.
+
+    Names, companies and cities are sampled once from Faker into fixed-size
+    pools and then indexed in bulk, so the per-row cost is a handful of
+    vectorized array operations instead of several Faker calls.
+    """
+
+    def __init__(self, num_employees: int, num_departments: int, seed: int = 42,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, distribution: Distribution = None):
+        self.num_employees = num_employees
+        self.chunk_size = chunk_size
+        self.num_departments = num_departments
+        self.seed = seed
+        self.distribution = distribution or Distribution()
+        self.reference_date = REFERENCE_DATE
+
+        # NumPy, pandas and Faker are only imported once rows are actually generated,
+        # so building a generator to look up a cached fixture stays cheap
+        self._rng = None
+        self._pools = None
+        self._sorted_department_ids = None
+
+    @property
+    def rng(self):
+        if self._rng is None:
+            import numpy as np
+            self._rng = np.random.default_rng(self.seed)
+        return self._rng
+
+    def pools(self) -> dict:
+        # Built on first use so that cache lookups never pay for Faker
+        if self._pools is None:
+            import numpy as np
+            from faker import Faker
+            fake = Faker()
+            fake.seed_instance(self.seed)
+            self._pools = {
+                pool: np.array([getattr(fake, pool)() for _ in range(NAME_POOL_SIZE)], dtype=object)
+                for pool in ('first_name', 'last_name', 'company', 'city')
+            }
+        return self._pools
+
+    def cache_key(self) -> dict:
+        # Everything that determines the generated rows
+        key = {
+            'version': GENERATOR_VERSION,
+            'num_employees': self.num_employees,
+            'num_departments': self.num_departments,
+            'seed': self.seed,
+            'chunk_size': self.chunk_size,
+        }
+        # Left out for the default so datasets cached before distributions existed stay valid
+        if self.distribution.changes():
+            key['distribution'] = self.distribution.changes()
+        return key
+
+    def label(self) -> str:
+        label = f"{self.num_employees}x{self.num_departments}s{self.seed}"
+        return label if not self.distribution.changes() else f"{label}+{self.distribution.label()}"
+
+    def extra_employee_columns(self) -> list:
+        columns = []
+        if self.distribution.payload_text_bytes:
+            columns.append(('payload_text', 'text'))
+        if self.distribution.payload_bytea_bytes:
+            columns.append(('payload_bytea', 'bytea'))
+        return columns
+
+    def _draw_department_ids(self, rng, n: int, sort: bool = False):
+        import numpy as np
+        import pandas as pd
+        distribution, d = self.distribution, self.num_departments
+        if distribution.skew == 'zipf':
+            weights = np.arange(1, d + 1, dtype=np.float64) ** -distribution.zipf_exponent
+            cdf = np.cumsum(weights) / weights.sum()
+            ids = np.minimum(np.searchsorted(cdf, rng.random(n), side='right'), d - 1).astype(np.int32) + 1
+        elif distribution.skew == 'hot':
+            ids = rng.integers(1, d + 1, n, dtype=np.int32)
+            hot = rng.random(n) < distribution.hot_fraction
+            ids[hot] = rng.integers(1, min(distribution.hot_keys, d) + 1, int(hot.sum()), dtype=np.int32)
+        else:
+            ids = rng.integers(1, d + 1, n, dtype=np.int32)
+
+        if distribution.dangling_fraction:
+            dangling = rng.random(n) < distribution.dangling_fraction
+            ids[dangling] = d + rng.integers(1, d + 1, int(dangling.sum()), dtype=np.int32)
+        if not distribution.null_fraction:
+            return np.sort(ids) if sort else ids
+
+        nulls = rng.random(n) < distribution.null_fraction
+        if sort:
+            # NULLs sort last, as in ORDER BY department_id
+            num_nulls = int(nulls.sum())
+            ids = np.concatenate([np.sort(ids[~nulls]), np.zeros(num_nulls, dtype=np.int32)])
+            nulls = np.arange(n) >= n - num_nulls
+        return pd.arrays.IntegerArray(ids, nulls)
+
+    def department_ids(self, start_id: int, n: int):
+        if self.distribution.order == 'sorted':
+            # A global order can't be produced chunk by chunk, so the column is drawn once from its own stream
+            if self._sorted_department_ids is None:
+                import numpy as np
+                self._sorted_department_ids = self._draw_department_ids(
+                    np.random.default_rng([self.seed, 1]), self.num_employees, sort=True)
+            return self._sorted_department_ids[start_id - 1:start_id - 1 + n]
+        return self._draw_department_ids(self.rng, n)
+
+    def payload(self, n: int, width: int, binary: bool):
+        import numpy as np
+        # Bytes start at 1 so the fixed-width view never strips trailing NULs
+        low, high = (1, 256) if binary else (ord('a'), ord('z') + 1)
+        values = self.rng.integers(low, high, (n, width), dtype=np.uint8).view(f'S{width}').ravel()
+        return values.astype(object) if binary else values.astype(f'U{width}').astype(object)
+
+    def generate_departments(self):
+        import numpy as np
+        import pandas as pd
+        n = self.num_departments
+        return pd.DataFrame({
+            'dept_id': np.arange(1, n + 1, dtype=np.int32),
+            'dept_name': self.pools()['company'][self.rng.integers(0, NAME_POOL_SIZE, n)],
+            'location': self.pools()['city'][self.rng.integers(0, NAME_POOL_SIZE, n)],
+            'budget': np.round(self.rng.uniform(50000, 500000, n), 2),
+        })
+
+    def generate_employees(self, start_id: int = 1, count: int = None):
+        import numpy as np
+        import pandas as pd
+        n = self.num_employees - start_id + 1 if count is None else count
+        # Same window as fake.date_between(start_date='-10y', end_date='today') on the reference date
+        span_days = HIRE_DATE_YEARS * 365
+        start_date = np.datetime64(self.reference_date, 'D') - np.timedelta64(span_days, 'D')
+        hire_dates = start_date + self.rng.integers(0, span_days + 1, n).astype('timedelta64[D]')
+
+        employees = pd.DataFrame({
+            'emp_id': np.arange(start_id, start_id + n, dtype=np.int32),
+            'first_name': self.pools()['first_name'][self.rng.integers(0, NAME_POOL_SIZE, n)],
+            'last_name': self.pools()['last_name'][self.rng.integers(0, NAME_POOL_SIZE, n)],
+            'department_id': self.department_ids(start_id, n),
+            'salary': np.round(self.rng.uniform(30000, 120000, n), 2),
+            'hire_date': hire_dates,
+        })
+        if self.distribution.payload_text_bytes:
+            employees['payload_text'] = self.payload(n, self.distribution.payload_text_bytes, binary=False)
+        if self.distribution.payload_bytea_bytes:
+            employees['payload_bytea'] = self.payload(n, self.distribution.payload_bytea_bytes, binary=True)
+        return employees
+
+    def iter_employee_chunks(self):
+        # Fixed-size chunks keep memory flat; the data depends only on seed and chunk_size
+        for start_id in range(1, self.num_employees + 1, self.chunk_size):
+            count = min(self.chunk_size, self.num_employees - start_id + 1)
+            yield self.generate_employees(start_id, count)
+
+    def generate(self):
+        import pandas as pd
+        # Departments first so a given seed always yields the same pair of tables
+        departments_df = self.generate_departments()
+        chunks = list(self.iter_employee_chunks())
+        employees_df = pd.concat(chunks, ignore_index=True) if chunks else self.generate_employees(1, 0)
+        return employees_df, departments_df
+
+
+def add_distribution_arguments(parser):
+    group = parser.add_argument_group("data distribution")
+    group.add_argument("--skew", choices=SKEWS, default='uniform', help="distribution of employees.department_id")
+    group.add_argument("--zipf-exponent", type=float, default=1.1)
+    group.add_argument("--hot-keys", type=int, default=1, help="with --skew hot, number of hot department ids")
+    group.add_argument("--hot-fraction", type=float, default=0.5, help="with --skew hot, share of rows on hot ids")
+    group.add_argument("--null-fraction", type=float, default=0.0, help="share of NULL department_id values")
+    group.add_argument("--dangling-fraction", type=float, default=0.0,
+                       help="share of department_id values with no matching department")
+    group.add_argument("--payload-text-bytes", type=int, default=0, help="width of an extra text column")
+    group.add_argument("--payload-bytea-bytes", type=int, default=0, help="width of an extra bytea column")
+    group.add_argument("--order", choices=ORDERS, default='random', help="physical order of employees")
+
+
+def distribution_from_args(args) -> Distribution:
+    return Distribution(skew=args.skew, zipf_exponent=args.zipf_exponent, hot_keys=args.hot_keys,
+                        hot_fraction=args.hot_fraction, dangling_fraction=args.dangling_fraction,
+                        null_fraction=args.null_fraction, payload_text_bytes=args.payload_text_bytes,
+                        payload_bytea_bytes=args.payload_bytea_bytes, order=args.order)
@@ -0,0 +1,64 @@
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+# One pass over employees for the row-level figures, in SQL every backend understands
+ROW_STATS = """
+SELECT count(*) AS rows,
+       coalesce(avg(CAST(e.department_id IS NULL AS INTEGER)), 0) AS null_fraction,
+       coalesce(avg(CAST(e.department_id IS NOT NULL AND d.dept_id IS NULL AS INTEGER)), 0) AS dangling_fraction,
+       count(DISTINCT e.department_id) AS distinct_keys
+FROM employees e LEFT JOIN departments d ON d.dept_id = e.department_id
+"""
+
+ROW_BYTES = "SELECT coalesce(avg(pg_column_size(e.*)), 0) FROM employees e"
+
+# Pages of the employees b-tree; DuckDB keeps no size per table
+SQLITE_TABLE_BYTES = "SELECT coalesce(sum(pgsize), 0) FROM dbstat WHERE name = 'employees'"
+
+TOP_KEYS = """
+SELECT count(*) FROM employees WHERE department_id IS NOT NULL
+GROUP BY department_id ORDER BY count(*) DESC LIMIT 10
+"""
+
+# What the planner believes, which is what misestimates come from
+PLANNER_STATS = """
+SELECT n_distinct, correlation, most_common_freqs[1] AS top_frequency
+FROM pg_stats WHERE schemaname = current_schema() AND tablename = 'employees' AND attname = 'department_id'
+"""
+
+
+def collect_dataset_stats(connection) -> dict:
+    """Realized shape of a loaded dataset: skew, NULLs, dangling keys, row width and physical order.
+
+    Row width and the planner's view only come from PostgreSQL, table size
+    from PostgreSQL and SQLite.
+    """
+    stats = {key: float(value) for key, value in connection.execute(text(ROW_STATS)).one()._mapping.items()}
+    stats['rows'] = int(stats['rows'])
+    stats['distinct_keys'] = int(stats['distinct_keys'])
+    top_counts = connection.execute(text(TOP_KEYS)).scalars().all()
+    stats['top1_share'] = top_counts[0] / stats['rows'] if top_counts else 0.0
+    stats['top10_share'] = sum(top_counts) / stats['rows'] if top_counts else 0.0
+    if connection.dialect.name == 'sqlite':
+        try:
+            stats['employees_bytes'] = int(connection.execute(text(SQLITE_TABLE_BYTES)).scalar())
+        except OperationalError:
+            # SQLite built without the dbstat table
+            pass
+    if connection.dialect.name != 'postgresql':
+        return stats
+    stats['avg_row_bytes'] = float(connection.execute(text(ROW_BYTES)).scalar())
+    stats['employees_bytes'] = connection.execute(text("SELECT pg_total_relation_size('employees')")).scalar()
+    # A freshly loaded table has no statistics until autovacuum gets to it
+    connection.execute(text("ANALYZE employees"))
+    planner = connection.execute(text(PLANNER_STATS)).one_or_none()
+    if planner is not None:
+        stats.update({'planner_' + key: value for key, value in planner._mapping.items()})
+    return stats
+
+
+def format_dataset_stats(stats: dict) -> str:
+    return (f"{stats['rows']} rows, {stats['distinct_keys']} keys, top-1 {stats['top1_share']:.1%}, "
+            f"top-10 {stats['top10_share']:.1%}, NULL {stats['null_fraction']:.1%}, "
+            f"dangling {stats['dangling_fraction']:.1%}, {stats.get('avg_row_bytes', 0):.0f} B/row, "
+            f"correlation {stats.get('planner_correlation') or 0:.2f}")
@@ -0,0 +1,212 @@
+import json
+from dataclasses import dataclass, field
+
+from sqlalchemy import text
+
+from profiler import traced
+
+EXPLAIN_OPTIONS = "ANALYZE, BUFFERS, TIMING, FORMAT JSON"
+
+
+@dataclass
+class PlanNode:
+    node_type: str
+    actual_startup_time: float = 0.0
+    actual_total_time: float = 0.0
+    plan_rows: float = 0.0
+    actual_rows: float = 0.0
+    loops: int = 1
+    relation_name: str = None
+    join_type: str = None
+    shared_hit_blocks: int = 0
+    shared_read_blocks: int = 0
+    temp_read_blocks: int = 0
+    temp_written_blocks: int = 0
+    hash_buckets: int = None
+    hash_batches: int = None
+    original_hash_batches: int = None
+    peak_memory_kb: int = None
+    sort_method: str = None
+    sort_space_used_kb: int = None
+    sort_space_type: str = None
+    children: list = field(default_factory=list)
+    raw: dict = field(default_factory=dict, repr=False)
+
+    @classmethod
+    def from_json(cls, node: dict) -> 'PlanNode':
+        return cls(
+            node_type=node['Node Type'],
+            actual_startup_time=node.get('Actual Startup Time', 0.0),
+            actual_total_time=node.get('Actual Total Time', 0.0),
+            plan_rows=node.get('Plan Rows', 0.0),
+            actual_rows=node.get('Actual Rows', 0.0),
+            loops=node.get('Actual Loops', 1),
+            relation_name=node.get('Relation Name'),
+            join_type=node.get('Join Type'),
+            shared_hit_blocks=node.get('Shared Hit Blocks', 0),
+            shared_read_blocks=node.get('Shared Read Blocks', 0),
+            temp_read_blocks=node.get('Temp Read Blocks', 0),
+            temp_written_blocks=node.get('Temp Written Blocks', 0),
+            hash_buckets=node.get('Hash Buckets'),
+            hash_batches=node.get('Hash Batches'),
+            original_hash_batches=node.get('Original Hash Batches'),
+            peak_memory_kb=node.get('Peak Memory Usage'),
+            sort_method=node.get('Sort Method'),
+            sort_space_used_kb=node.get('Sort Space Used'),
+            sort_space_type=node.get('Sort Space Type'),
+            children=[cls.from_json(child) for child in node.get('Plans', [])],
+            raw={key: value for key, value in node.items() if key != 'Plans'},
+        )
+
+    @property
+    def label(self) -> str:
+        parts = [self.node_type]
+        if self.join_type and self.join_type != 'Inner':
+            parts.append(f"({self.join_type})")
+        if self.relation_name:
+            parts.append(f"on {self.relation_name}")
+        return " ".join(parts)
+
+    @property
+    def inclusive_time(self) -> float:
+        # Actual times are per loop, so scale by loops to get the node's total contribution
+        return self.actual_total_time * self.loops
+
+    @property
+    def exclusive_time(self) -> float:
+        return max(self.inclusive_time - sum(child.inclusive_time for child in self.children), 0.0)
+
+    @property
+    def row_misestimate(self) -> float:
+        """Ratio >= 1 between estimated and actual rows per loop, in whichever direction is off."""
+        estimated, actual = max(self.plan_rows, 1.0), max(self.actual_rows, 1.0)
+        return max(estimated, actual) / min(estimated, actual)
+
+    @property
+    def exclusive_temp_written_blocks(self) -> int:
+        # Buffer counters include the node's children, like the inclusive time
+        return max(self.temp_written_blocks - sum(child.temp_written_blocks for child in self.children), 0)
+
+    @property
+    def memory_kb(self) -> int:
+        """Memory the node's hash table or in-memory sort used."""
+        if self.peak_memory_kb is not None:
+            return self.peak_memory_kb
+        return self.sort_space_used_kb if self.sort_space_type == 'Memory' else 0
+
+    @property
+    def spilled(self) -> bool:
+        return (bool(self.hash_batches and self.hash_batches > 1)
+                or self.sort_space_type == 'Disk'
+                or self.exclusive_temp_written_blocks > 0)
+
+    def walk(self):
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+
+@dataclass
+class QueryPlan:
+    root: PlanNode
+    planning_time: float
+    execution_time: float
+    jit_time: float = 0.0
+    raw: list = field(default_factory=list, repr=False)
+
+    @classmethod
+    def from_json(cls, document) -> 'QueryPlan':
+        if isinstance(document, str):
+            document = json.loads(document)
+        top = document[0]
+        return cls(
+            root=PlanNode.from_json(top['Plan']),
+            planning_time=top.get('Planning Time', 0.0),
+            execution_time=top.get('Execution Time', 0.0),
+            jit_time=top.get('JIT', {}).get('Timing', {}).get('Total', 0.0),
+            raw=document,
+        )
+
+    def nodes(self) -> list:
+        return list(self.root.walk())
+
+    def largest_misestimates(self, limit: int = 3) -> list:
+        return sorted(self.nodes(), key=lambda node: node.row_misestimate, reverse=True)[:limit]
+
+    def spilled_nodes(self) -> list:
+        return [node for node in self.nodes() if node.spilled]
+
+    def hottest_node(self) -> PlanNode:
+        return max(self.nodes(), key=lambda node: node.exclusive_time)
+
+    def join_methods(self) -> list:
+        return [node.node_type for node in self.nodes() if node.node_type in ('Nested Loop', 'Hash Join', 'Merge Join')]
+
+    def indexes_used(self) -> list:
+        return sorted({node.raw['Index Name'] for node in self.nodes() if 'Index Name' in node.raw})
+
+    def peak_memory_kb(self) -> int:
+        """Largest memory any single node used; partition-wise joins split one large hash table into many small ones."""
+        return max(node.memory_kb for node in self.nodes())
+
+    def workers_launched(self) -> int:
+        return sum(node.raw.get('Workers Launched', 0) for node in self.nodes())
+
+    def summary(self) -> dict:
+        hottest = self.hottest_node()
+        return {
+            'planning_ms': self.planning_time,
+            'execution_ms': self.execution_time,
+            'jit_ms': self.jit_time,
+            'workers_launched': self.workers_launched(),
+            'join_methods': self.join_methods(),
+            'shared_hit_blocks': self.root.shared_hit_blocks,
+            'shared_read_blocks': self.root.shared_read_blocks,
+            'temp_written_blocks': self.root.temp_written_blocks,
+            'hottest_node': hottest.label,
+            'hottest_exclusive_ms': hottest.exclusive_time,
+            'worst_misestimate': max(node.row_misestimate for node in self.nodes()),
+            'spilled_nodes': [node.label for node in self.spilled_nodes()],
+        }
+
+    def format(self) -> str:
+        lines = []
+
+        def visit(node: PlanNode, depth: int):
+            details = [f"rows={node.actual_rows:.0f} est={node.plan_rows:.0f} loops={node.loops}",
+                       f"time={node.actual_total_time:.3f} ms excl={node.exclusive_time:.3f} ms",
+                       f"hit={node.shared_hit_blocks} read={node.shared_read_blocks}"]
+            if node.hash_batches is not None:
+                details.append(f"buckets={node.hash_buckets} batches={node.hash_batches} "
+                               f"mem={node.peak_memory_kb}kB")
+            if node.sort_method:
+                details.append(f"sort={node.sort_method} {node.sort_space_used_kb}kB {node.sort_space_type}")
+            lines.append(f"{'  ' * depth}-> {node.label} ({', '.join(details)})")
+            for child in node.children:
+                visit(child, depth + 1)
+
+        visit(self.root, 0)
+        lines.append(f"Planning Time: {self.planning_time:.3f} ms")
+        if self.jit_time:
+            lines.append(f"JIT: {self.jit_time:.3f} ms")
+        lines.append(f"Execution Time: {self.execution_time:.3f} ms")
+        return "\n".join(lines)
+
+    def format_summary(self) -> str:
+        lines = []
+        hottest = self.hottest_node()
+        lines.append(f"Hottest node: {hottest.label} ({hottest.exclusive_time:.3f} ms exclusive)")
+        for node in self.largest_misestimates():
+            if node.row_misestimate > 1:
+                lines.append(f"Misestimate x{node.row_misestimate:.1f}: {node.label} "
+                             f"(estimated {node.plan_rows:.0f}, actual {node.actual_rows:.0f})")
+        for node in self.spilled_nodes():
+            lines.append(f"Spilled: {node.label} (batches={node.hash_batches}, sort={node.sort_space_type}, "
+                         f"temp written={node.exclusive_temp_written_blocks} blocks)")
+        return "\n".join(lines)
+
+
+@traced('explain')
+def capture_plan(connection, query: str) -> QueryPlan:
+    document = connection.execute(text(f"EXPLAIN ({EXPLAIN_OPTIONS}) {query}")).scalar()
+    return QueryPlan.from_json(document)
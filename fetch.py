@@ -0,0 +1,60 @@
+from sqlalchemy import text
+
+FETCH_MODES = ('count', 'fetchall', 'stream', 'dataframe')
+DEFAULT_BATCH_SIZE = 10000
+
+# Per-row framing of a DataRow message (type byte, length, field count) and per-field length word
+DATA_ROW_OVERHEAD = 7
+FIELD_OVERHEAD = 4
+
+
+class ResultFetcher:
+    """Runs a query and moves its result to the client in one of FETCH_MODES.
+
+    count      - SELECT count(*) over the query; only one row crosses the wire
+    fetchall   - buffered execute + fetchall through SQLAlchemy
+    stream     - server-side named cursor read in batches of batch_size rows
+    dataframe  - rows decoded straight into a pandas DataFrame
+    """
+
+    def __init__(self, mode: str = 'fetchall', batch_size: int = DEFAULT_BATCH_SIZE):
+        if mode not in FETCH_MODES:
+            raise ValueError(f"fetch mode must be one of {FETCH_MODES}, got {mode!r}")
+        self.mode = mode
+        self.batch_size = batch_size
+
+    def run(self, connection, query: str, parameters: dict = None) -> int:
+        """Executes the query with its bound parameters and returns the number of rows in its result."""
+        if self.mode == 'count':
+            return connection.execute(text(f"SELECT count(*) FROM ({query}) AS q"), parameters).scalar()
+        if self.mode == 'fetchall':
+            return len(connection.execute(text(query), parameters).fetchall())
+        if self.mode == 'stream':
+            result = connection.execute(text(query), parameters, execution_options={'yield_per': self.batch_size})
+            return sum(len(partition) for partition in result.partitions())
+        import pandas as pd
+        return len(pd.read_sql_query(text(query), connection, params=parameters))
+
+    def run_sized(self, connection, query: str, parameters: dict = None) -> tuple:
+        """Like run, but also estimates the bytes of result data sent to the client; returns (rows, bytes).
+
+        The estimate is the text encoding of every value fetched plus the
+        protocol framing, so it costs client time and belongs in an untimed run.
+        """
+        if self.mode == 'count':
+            return self.run(connection, query, parameters), DATA_ROW_OVERHEAD + FIELD_OVERHEAD + 8
+        if self.mode == 'dataframe':
+            import pandas as pd
+            frame = pd.read_sql_query(text(query), connection, params=parameters)
+            # NULLs come back as NaN, which no bytes were sent for
+            frame = frame.astype(object).where(frame.notna(), None)
+            num_fields, result = len(frame.columns), frame.itertuples(index=False, name=None)
+        else:
+            options = {'yield_per': self.batch_size} if self.mode == 'stream' else {}
+            result = connection.execute(text(query), parameters, execution_options=options)
+            num_fields = len(result.keys())
+        rows = payload = 0
+        for row in result:
+            rows += 1
+            payload += sum(len(str(value).encode('utf-8')) for value in row if value is not None)
+        return rows, payload + rows * (DATA_ROW_OVERHEAD + FIELD_OVERHEAD * num_fields)
@@ -0,0 +1,116 @@
+import hashlib
+import time
+from dataclasses import dataclass, field
+
+from sqlalchemy import text
+
+
+@dataclass(frozen=True)
+class Fingerprint:
+    """Order-independent summary of a result: its row count and the sum of a 64-bit hash of every row."""
+    rows: int
+    digest: int
+
+    def __str__(self):
+        return f"{self.rows} rows, digest {self.digest & 0xffffffffffffffff:016x}"
+
+
+@dataclass
+class Mismatch:
+    group: str
+    label: str
+    fingerprint: Fingerprint
+    reference_label: str
+    reference: Fingerprint
+
+    def __str__(self):
+        return (f"{self.group}: {self.label} returned {self.fingerprint}, "
+                f"{self.reference_label} returned {self.reference}")
+
+
+class ResultMismatchError(Exception):
+    pass
+
+
+@dataclass
+class ResultVerifier:
+    """Checks that every way of running a query returns the same rows, without moving them to the client.
+
+    Each result is reduced on the server to a Fingerprint, at the cost of
+    one more execution of the query. The first result seen in a group is
+    the reference the rest are compared against. Groups should hold
+    results of one query on one dataset, however it was run: join method,
+    indexes, settings or rewrite.
+    """
+    fingerprints: dict = field(default_factory=dict)
+    mismatches: list = field(default_factory=list)
+    # Backends that can't fingerprint on the server, so their results go unchecked
+    skipped: set = field(default_factory=set)
+    checks: int = 0
+    seconds: float = 0.0
+
+    def fingerprint(self, connection, query: str, parameters: dict = None) -> Fingerprint:
+        from backends import BACKENDS
+        template = BACKENDS[connection.dialect.name].fingerprint_sql
+        if template is None:
+            self.skipped.add(connection.dialect.name)
+            return None
+        start_time = time.perf_counter()
+        rows, digest = connection.execute(text(template.format(query=query)), parameters).one()
+        self.seconds += time.perf_counter() - start_time
+        return Fingerprint(int(rows), int(digest))
+
+    def check(self, connection, group: str, label: str, query: str, parameters: dict = None) -> Fingerprint:
+        """Fingerprints the query's result and compares it with the first one recorded for the group."""
+        fingerprint = self.fingerprint(connection, query, parameters)
+        if fingerprint is None:
+            return None
+        return self.compare(group, label, fingerprint)
+
+    def check_rows(self, connection, group: str, label: str, query: str, parameter_sets: list) -> Fingerprint:
+        """Like check, for statements such as EXECUTE that can't be nested in the fingerprint query.
+
+        The rows of every parameter set are fetched and hashed on the client,
+        so the result is only comparable with other check_rows fingerprints.
+        """
+        start_time = time.perf_counter()
+        rows = digest = 0
+        for parameters in parameter_sets:
+            for row in connection.execute(text(query), parameters):
+                rows += 1
+                digest += int.from_bytes(hashlib.blake2b(repr(tuple(row)).encode('utf-8'), digest_size=8).digest(),
+                                         'little', signed=True)
+        self.seconds += time.perf_counter() - start_time
+        return self.compare(group, label, Fingerprint(rows, digest))
+
+    def compare(self, group: str, label: str, fingerprint: Fingerprint) -> Fingerprint:
+        self.checks += 1
+        reference = self.fingerprints.setdefault(group, (label, fingerprint))
+        if reference[1] != fingerprint:
+            self.mismatches.append(Mismatch(group, label, fingerprint, *reference))
+            print(f"Result mismatch: {self.mismatches[-1]}")
+        return fingerprint
+
+    def merge(self, other: 'ResultVerifier'):
+        """Adds another verifier's findings, such as a worker process's; their groups must not overlap."""
+        self.fingerprints.update(other.fingerprints)
+        self.mismatches.extend(other.mismatches)
+        self.skipped |= other.skipped
+        self.checks += other.checks
+        self.seconds += other.seconds
+
+    def mismatched(self, label: str, group_prefix: str = "") -> bool:
+        return any(mismatch.label == label and mismatch.group.startswith(group_prefix)
+                   for mismatch in self.mismatches)
+
+    def report(self) -> str:
+        lines = [f"Verified {self.checks} results in {len(self.fingerprints)} groups "
+                 f"({self.seconds:.3f} s of fingerprinting): {len(self.mismatches)} mismatches"]
+        lines.extend(f"  {mismatch}" for mismatch in self.mismatches)
+        if self.skipped:
+            lines.append(f"  Not verified on {', '.join(sorted(self.skipped))}: no server-side row hash")
+        return "\n".join(lines)
+
+    def raise_for_mismatches(self):
+        if self.mismatches:
+            raise ResultMismatchError(self.report())
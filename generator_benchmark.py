@@ -0,0 +1,65 @@
+import argparse
+import random
+import time
+
+import pandas as pd
+from faker import Faker
+
+from data_generator import DataGenerator
+
+
+def generate_faker_rows(num_employees: int, num_departments: int):
+    # The original per-row path used by the test classes, kept as the baseline
+    fake = Faker()
+    employees = []
+    departments = []
+
+    for dept_id in range(1, num_departments + 1):
+        departments.append({
+            'dept_id': dept_id,
+            'dept_name': fake.company(),
+            'location': fake.city(),
+            'budget': round(random.uniform(50000, 500000), 2)
+        })
+
+    for emp_id in range(1, num_employees + 1):
+        employees.append({
+            'emp_id': emp_id,
+            'first_name': fake.first_name(),
+            'last_name': fake.last_name(),
+            'department_id': random.randint(1, num_departments),
+            'salary': round(random.uniform(30000, 120000), 2),
+            'hire_date': fake.date_between(start_date='-10y', end_date='today')
+        })
+
+    return pd.DataFrame(employees), pd.DataFrame(departments)
+
+
+def generate_vectorized(num_employees: int, num_departments: int):
+    return DataGenerator(num_employees, num_departments).generate()
+
+
+def benchmark(generator, num_employees: int, num_departments: int) -> float:
+    start_time = time.perf_counter()
+    employees_df, _ = generator(num_employees, num_departments)
+    elapsed = time.perf_counter() - start_time
+    assert len(employees_df) == num_employees
+    return num_employees / elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare row generation throughput")
+    parser.add_argument("--employees", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--departments", type=int, default=100)
+    parser.add_argument("--faker-limit", type=int, default=100000,
+                        help="skip the Faker baseline above this many rows")
+    args = parser.parse_args()
+
+    for num_employees in args.employees:
+        vectorized = benchmark(generate_vectorized, num_employees, args.departments)
+        if num_employees <= args.faker_limit:
+            faker = benchmark(generate_faker_rows, num_employees, args.departments)
+            print(f"{num_employees:>10} rows: faker {faker:>12,.0f} rows/s | "
+                  f"vectorized {vectorized:>12,.0f} rows/s | speedup {vectorized / faker:.1f}x")
+        else:
+            print(f"{num_employees:>10} rows: faker      skipped | vectorized {vectorized:>12,.0f} rows/s")
@@ -0,0 +1,104 @@
+from dataclasses import dataclass, field
+
+WORK_MEM = 'work_mem'
+PARALLEL_WORKERS = 'max_parallel_workers_per_gather'
+MEMORY_UNITS = {'kB': 1, 'MB': 1024, 'GB': 1024 ** 2, 'TB': 1024 ** 3}
+
+
+def memory_kb(value: str) -> int:
+    """Size of a memory GUC such as '64kB' or '4MB' in kB; a bare number is already in kB."""
+    value = value.strip()
+    for unit, factor in MEMORY_UNITS.items():
+        if value.endswith(unit):
+            return int(float(value[:-len(unit)]) * factor)
+    return int(value)
+
+
+def group_key(cell, without: str) -> str:
+    """The cell's key with one GUC left out, so cells differing only in that GUC share it."""
+    settings = ",".join(f"{name}={value}" for name, value in cell.gucs if name != without)
+    return "/".join([cell.dataset.key, cell.index_set, cell.query, cell.join_method, settings or "default"])
+
+
+def swept_groups(results: list, guc: str) -> dict:
+    """Successful results grouped by everything but guc, each group as {guc value: result}."""
+    groups = {}
+    for result in results:
+        settings = dict(result.cell.gucs)
+        if result.error is None and guc in settings:
+            groups.setdefault(group_key(result.cell, guc), {})[settings[guc]] = result
+    return {key: values for key, values in groups.items() if len(values) > 1}
+
+
+@dataclass
+class WorkMemThreshold:
+    group: str
+    # Smallest tested work_mem from which on no hash join runs multi-batch and no sort goes to disk
+    smallest: str = None
+    largest_spilling: str = None
+    spilled_nodes: list = field(default_factory=list)
+
+    def __str__(self):
+        if self.largest_spilling is None:
+            return f"{self.group}: no spill at any tested work_mem (smallest {self.smallest})"
+        if self.smallest is None:
+            return f"{self.group}: spills at every tested work_mem, up to {self.largest_spilling} " \
+                   f"({', '.join(self.spilled_nodes)})"
+        return f"{self.group}: work_mem >= {self.smallest} avoids spilling " \
+               f"({', '.join(self.spilled_nodes)} spilled at {self.largest_spilling})"
+
+
+@dataclass
+class ParallelScaling:
+    group: str
+    # workers requested -> (median ms, workers actually launched)
+    points: dict = field(default_factory=dict)
+
+    def speedups(self) -> list:
+        """(workers, launched, speedup over the fewest workers, speedup over the previous step) per step."""
+        workers = sorted(self.points)
+        base_ms = self.points[workers[0]][0]
+        rows = []
+        for previous, current in zip([workers[0]] + workers, workers):
+            median_ms, launched = self.points[current]
+            rows.append((current, launched, base_ms / median_ms, self.points[previous][0] / median_ms))
+        return rows
+
+    def __str__(self):
+        steps = ", ".join(f"{workers} ({launched} launched) x{total:.2f} [step x{step:.2f}]"
+                          for workers, launched, total, step in self.speedups())
+        return f"{self.group}: {steps}"
+
+
+def work_mem_thresholds(results: list) -> list:
+    thresholds = []
+    for key, by_value in sorted(swept_groups(results, WORK_MEM).items()):
+        threshold = WorkMemThreshold(key)
+        for value in sorted(by_value, key=memory_kb, reverse=True):
+            spilled = by_value[value].plan.spilled_nodes()
+            if spilled:
+                threshold.largest_spilling = value
+                threshold.spilled_nodes = [node.label for node in spilled]
+                break
+            threshold.smallest = value
+        thresholds.append(threshold)
+    return thresholds
+
+
+def parallel_scaling(results: list) -> list:
+    return [ParallelScaling(key, {int(value): (result.measurement.median_ms, result.plan.workers_launched())
+                                  for value, result in by_value.items()})
+            for key, by_value in sorted(swept_groups(results, PARALLEL_WORKERS).items())]
+
+
+def format_guc_report(results: list) -> str:
+    lines = []
+    thresholds = work_mem_thresholds(results)
+    if thresholds:
+        lines.append("Smallest work_mem without multi-batch hashing or external sorts:")
+        lines.extend(f"  {threshold}" for threshold in thresholds)
+    scaling = parallel_scaling(results)
+    if scaling:
+        lines.append("Speedup per parallel worker (max_parallel_workers_per_gather):")
+        lines.extend(f"  {entry}" for entry in scaling)
+    return "\n".join(lines)
@@ -1,108 +1,78 @@
-import time
-import matplotlib.pyplot as plt
-import numpy as np
-import random
-import pandas as pd
-from sqlalchemy import create_engine, text
+from backends import backend_for
 from performance_test import PerformanceTest
-from faker import Faker
+from data_generator import DataGenerator
+from measurement import MeasurementEngine
+from queries import PLANNER_CHOICE
 
 
 class JoinLikeTest(PerformanceTest):
-    def __init__(self, db_url: str, num_employees: int, num_departments: int):
-        self.engine = create_engine(db_url)
+    def __init__(self, db_url: str, num_employees: int, num_departments: int, measurement: MeasurementEngine = None,
+                 preloaded: bool = False):
+        self.backend = backend_for(db_url)
+        self.engine = self.backend.create_engine()
+        self.measurement = measurement or MeasurementEngine(self.engine)
         self.num_employees = num_employees
         self.num_departments = num_departments
+        self.preloaded = preloaded
         self.queries = [
-            ("Join using LIKE", "SELECT * FROM employees e JOIN departments d ON e.department_id::TEXT LIKE d.dept_id::TEXT || '%'")
+            ("Join using LIKE", "SELECT * FROM employees e JOIN departments d ON CAST(e.department_id AS TEXT) LIKE CAST(d.dept_id AS TEXT) || '%'")
         ]
 
     def generate_data(self):
-        fake = Faker()
-        employees = []
-        departments = []
-
-        # Generate department data
-        for dept_id in range(1, self.num_departments + 1):
-            departments.append({
-                'dept_id': dept_id,
-                'dept_name': fake.company(),
-                'location': fake.city(),
-                'budget': round(random.uniform(50000, 500000), 2)
-            })
-
-        # Generate employee data
-        for emp_id in range(1, self.num_employees + 1):
-            employees.append({
-                'emp_id': emp_id,
-                'first_name': fake.first_name(),
-                'last_name': fake.last_name(),
-                'department_id': random.randint(1, self.num_departments),
-                'salary': round(random.uniform(30000, 120000), 2),
-                'hire_date': fake.date_between(start_date='-10y', end_date='today')
-            })
-
-        return pd.DataFrame(employees), pd.DataFrame(departments)
+        # Rows are produced lazily in chunks by the loading pipeline
+        return DataGenerator(self.num_employees, self.num_departments)
 
     def measure_execution(self, query, connection):
-        execution_time = None
-        start_time = time.time()
-        connection.execute(text(query))
-        end_time = time.time()
-        execution_time = end_time - start_time
-
-        # Get the execution plan
-        plan = connection.execute(text(f"EXPLAIN ANALYZE {query}")).fetchall()
-        return execution_time * 1000, plan
+        # The execution plan is captured as the first warm-up run, so the query doesn't run an extra time for it
+        measurement = self.measurement.measure(connection, query, explain=self.backend.capture_plan)
+        return measurement, measurement.plan
 
     def execute(self):
-        def parse_actual_time(plan):
-            for index, line in enumerate(plan):
-                if index == 0:
-                    parts = line[0].split('actual time=')
-                    time_part = parts[1].split('..')[1]
-                    value = float(time_part.split()[0])
-                    return value
-
-        employees_df, departments_df = self.generate_data()
-        employees_df.to_sql('employees', self.engine, if_exists='replace', index=False)
-        departments_df.to_sql('departments', self.engine, if_exists='replace', index=False)
-
-        join_methods = ["nestloop", "hashjoin", "mergejoin"]
+        # Preloaded databases are clones from the fixture cache
+        if not self.preloaded:
+            self.backend.load(self.engine, self.generate_data())
+
+        join_methods = self.backend.runnable_join_methods(["nestloop", "hashjoin", "mergejoin"])
+        join_method_names = {"nestloop": "Nested Loop", "hashjoin": "Hash Join", "mergejoin": "Merge Join"}
         execution_results = []
 
-        with self.engine.connect() as connection:
+        with self.timing_lock, self.engine.connect() as connection:
 
             for join_method in join_methods:
                 # Enable the specific join method and disable others
-                connection.execute(text(f"SET enable_{join_method} = on;"))
-                for disabled_method in [m for m in join_methods if m != join_method]:
-                    connection.execute(text(f"SET enable_{disabled_method} = off;"))
+                self.backend.apply_join_method(connection, join_method)
 
                 for name, query in self.queries:
-                    exec_time, plan = self.measure_execution(query, connection)
-                    actual_time = parse_actual_time(plan)
-                    execution_results.append((f"{name} {join_method}", exec_time, plan, join_method, actual_time))
+                    measurement, plan = self.measure_within_budget(connection, f"{name} {join_method}", query)
+                    if measurement is None:
+                        continue
+                    self.verify_result(connection, name, f"{name} {join_method}", query)
+                    actual_time = plan.execution_time
+                    execution_results.append((f"{name} {join_method}", measurement, plan, join_method, actual_time))
 
         # Reset all join methods
-            for method in join_methods:
-                connection.execute(text(f"SET enable_{method} = on;"))
+            self.backend.reset_settings(connection)
 
         # Print the plans
-        for name, exec_time, plan, join_method, actual_time in execution_results:
+        for name, measurement, plan, join_method, actual_time in execution_results:
             print("--------------------------------------------------")
             print(f"Query: {name}")
-            print(f"Execution Time: {exec_time:.4f} ms")
+            print(f"Execution Time: {measurement}")
             print(f"Explained Time: {actual_time:.4f} ms")
             print(f"Join Method: {join_method}")
+            if join_method != PLANNER_CHOICE and join_method_names[join_method] not in plan.join_methods():
+                # Non-equi joins can only run as a nested loop whatever is enabled
+                print(f"Planner fell back to: {', '.join(plan.join_methods())}")
             print("--------------------------------------------------")
             print("Execution Plan:")
-            for line in plan:
-                print(line[0])
+            print(plan.format())
+            print(plan.format_summary())
             print("--------------------------------------------------")
 
+        self.record_results(execution_results)
+
         query_names = [result[0] for result in execution_results]
-        execution_times = [result[1] for result in execution_results]
+        execution_times = [result[1].median_ms for result in execution_results]
         explained_times = [result[4] for result in execution_results]
         
 
@@ -111,6 +81,8 @@ class JoinLikeTest(PerformanceTest):
         self.plot_results(execution_times, query_names, f"Join Like Test ({self.num_employees})", join_methods, explained_times)
     
     def plot_results(self, execution_times: list, query_names: list, title: str, join_methods: list, actual_times: list):
+        import matplotlib.pyplot as plt
+        import numpy as np
         # Set up the figure
         fig, ax = plt.subplots(figsize=(12, 8))
         
@@ -131,10 +103,10 @@ class JoinLikeTest(PerformanceTest):
         ax.legend()
         
         plt.tight_layout()
-        plt.show()
+        self.show_figure(fig, title)
 
 
         
     def purge_tables(self):
         with self.engine.connect() as connection:
-            connection.execute(text("DROP SCHEMA public CASCADE; CREATE SCHEMA public;"))
+            self.backend.purge_tables(connection)
@@ -0,0 +1,160 @@
+from dataclasses import dataclass
+
+from sqlalchemy import create_engine, text
+
+from data_generator import DataGenerator
+from explain import QueryPlan, capture_plan
+from measurement import Measurement, MeasurementEngine
+from performance_test import PerformanceTest
+from rewrites import REWRITES, Rewrite, difference_query, original
+
+
+@dataclass
+class RewriteResult:
+    query: str
+    rewrite: Rewrite
+    measurement: Measurement
+    plan: QueryPlan
+    missing_rows: int = 0
+    extra_rows: int = 0
+    # False when the original was censored by the budget, leaving nothing to check the rewrite against
+    checked: bool = True
+
+    @property
+    def equivalent(self) -> bool:
+        return self.missing_rows == 0 and self.extra_rows == 0
+
+
+class JoinRewriteTest(PerformanceTest):
+    """Times the LIKE and BETWEEN joins side by side with result-equivalent rewrites.
+
+    The original forms can only run as nested loops. Each rewrite is
+    measured with the planner free to choose any join method, then checked
+    to return exactly the same multiset of rows as the original. With a
+    verifier, the check compares result fingerprints, and the much dearer
+    row-by-row difference only runs to count the rows of a rewrite whose
+    fingerprint differs. Cells censored by the budget are not checked, and
+    neither are the rewrites of an original the budget censored, since
+    checking them would run the original after all.
+    """
+
+    # Range types, GiST and the schema reset are PostgreSQL's
+    backends = ('postgresql',)
+
+    def __init__(self, db_url: str, num_employees: int, num_departments: int, measurement: MeasurementEngine = None,
+                 query_keys: list = None, preloaded: bool = False):
+        self.engine = create_engine(db_url)
+        self.measurement = measurement or MeasurementEngine(self.engine)
+        self.num_employees = num_employees
+        self.num_departments = num_departments
+        self.query_keys = query_keys or list(REWRITES)
+        self.preloaded = preloaded
+
+    def generate_data(self):
+        return DataGenerator(self.num_employees, self.num_departments)
+
+    def measure_execution(self, query: str, connection):
+        # The execution plan is captured as the first warm-up run, so the query doesn't run an extra time for it
+        measurement = self.measurement.measure(connection, query, explain=capture_plan)
+        return measurement, measurement.plan
+
+    def run_statements(self, statements: tuple):
+        if not statements:
+            return
+        with self.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            for statement in statements:
+                connection.execute(text(statement))
+            connection.execute(text("ANALYZE employees, departments"))
+
+    def check_equivalence(self, connection, original_sql: str, rewrite_sql: str) -> tuple:
+        return tuple(connection.execute(text(difference_query(original_sql, rewrite_sql))).one())
+
+    def execute(self):
+        if not self.preloaded:
+            from pipeline import StreamingPipeline
+            StreamingPipeline(self.engine, self.generate_data()).run()
+
+        results = []
+        with self.timing_lock:
+            for key in self.query_keys:
+                baseline = original(key)
+                reference = None
+                baseline_measured = False
+                for rewrite in [baseline] + REWRITES[key]:
+                    self.run_statements(rewrite.setup)
+                    try:
+                        with self.engine.connect() as connection:
+                            measurement, plan = self.measure_within_budget(connection, f"{key}/{rewrite.name}",
+                                                                           rewrite.sql)
+                            if measurement is None:
+                                continue
+                            checked = rewrite is baseline or baseline_measured
+                            missing, extra = 0, 0
+                            if checked:
+                                # The original is fingerprinted first: the reference its rewrites are checked against
+                                fingerprint = self.verify_result(connection, key, rewrite.name, rewrite.sql)
+                                if rewrite is baseline:
+                                    reference, baseline_measured = fingerprint, True
+                                elif fingerprint is None or fingerprint != reference:
+                                    missing, extra = self.check_equivalence(connection, baseline.sql, rewrite.sql)
+                    finally:
+                        self.run_statements(rewrite.teardown)
+                    result = RewriteResult(key, rewrite, measurement, plan, missing, extra, checked)
+                    results.append(result)
+                    self.record(result)
+
+        print("--------------------------------------------------")
+        for key in self.query_keys:
+            query_results = [result for result in results if result.query == key]
+            # The original may have been censored by the budget, leaving nothing to compare against
+            baseline_ms = next((result.measurement.median_ms for result in query_results
+                                if result.rewrite.name == original(key).name), None)
+            print(f"{key}:")
+            for result in query_results:
+                status = "unchecked, original censored" if not result.checked else "equivalent" if result.equivalent \
+                    else f"NOT EQUIVALENT ({result.missing_rows} missing, {result.extra_rows} extra rows)"
+                if result.rewrite.assumes:
+                    status += f", assumes {result.rewrite.assumes}"
+                speedup = f"x{baseline_ms / result.measurement.median_ms:.2f}" if baseline_ms else "-"
+                print(f"  {result.rewrite.name:<40} {result.measurement.median_ms:>10.3f} ms  {speedup:<8} "
+                      f"{', '.join(result.plan.join_methods()) or '-':<24} {status}")
+        print("--------------------------------------------------")
+
+        if any(not result.equivalent for result in results):
+            print("Some rewrites did not return the same rows as the original; their timings are not comparable")
+
+        self.purge_tables()
+        self.plot_results(results, f"Join Rewrite Test ({self.num_employees})")
+        return results
+
+    def record(self, result: RewriteResult):
+        if self.results_store is None:
+            return
+        self.results_store.record(
+            self.run_id, f"{self.scope}/{result.query}/{result.rewrite.name}",
+            result.measurement, result.plan, status='ok' if result.equivalent else 'mismatch',
+            context={'test': type(self).__name__, 'num_employees': self.num_employees,
+                     'num_departments': self.num_departments, 'query': result.query,
+                     'rewrite': result.rewrite.name, 'missing_rows': result.missing_rows,
+                     'extra_rows': result.extra_rows, 'checked': result.checked})
+
+    def plot_results(self, results: list, title: str):
+        import matplotlib.pyplot as plt
+
+        fig, ax = plt.subplots(figsize=(12, 8))
+        labels = [f"{result.query}: {result.rewrite.name}" for result in results]
+        colors = ['grey' if result.rewrite.name.startswith('original') else
+                  'steelblue' if result.equivalent else 'red' for result in results]
+        ax.barh(labels, [result.measurement.median_ms for result in results], color=colors)
+        ax.set_xscale('log')
+        ax.set_xlabel('Median time (ms)')
+        ax.set_title(title)
+        ax.invert_yaxis()
+
+        plt.tight_layout()
+        self.show_figure(fig, title)
+
+    def purge_tables(self):
+        with self.engine.connect() as connection:
+            connection.execute(text("DROP SCHEMA public CASCADE; CREATE SCHEMA public;"))
+            connection.commit()
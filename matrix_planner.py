@@ -0,0 +1,212 @@
+import itertools
+import math
+import os
+from dataclasses import dataclass, field
+
+from data_generator import Distribution
+from queries import INDEX_SETS, JOIN_METHODS, JOIN_QUERIES, PLANNER_CHOICE
+
+DEFAULT_SPEC = os.path.join('benchmarks', 'default.toml')
+
+# Rough costs used only for the up-front runtime estimate
+LOAD_ROWS_PER_SECOND = 300_000
+CLONE_SECONDS = 0.1
+INDEX_ROWS_PER_SECOND = 2_000_000
+SECONDS_PER_ROW = 2e-7
+SECONDS_PER_PAIR = 1.5e-7
+SECONDS_PER_RESULT_ROW = 4e-6
+# Approximate result rows per employee for each query shape
+RESULT_ROWS_PER_EMPLOYEE = {'on': 1, 'like': 2, 'between': 11}
+
+
+@dataclass(frozen=True)
+class Dataset:
+    num_employees: int
+    num_departments: int
+    seed: int = 42
+    distribution: Distribution = Distribution()
+
+    @property
+    def key(self) -> str:
+        key = f"{self.num_employees}x{self.num_departments}s{self.seed}"
+        return key if not self.distribution.changes() else f"{key}+{self.distribution.label()}"
+
+
+@dataclass(frozen=True)
+class Cell:
+    dataset: Dataset
+    index_set: str
+    query: str
+    join_method: str
+    gucs: tuple = ()
+
+    @property
+    def key(self) -> str:
+        settings = ",".join(f"{name}={value}" for name, value in self.gucs)
+        return "/".join([self.dataset.key, self.index_set, self.query, self.join_method, settings or "default"])
+
+
+@dataclass
+class IndexStage:
+    index_set: str
+    cells: list = field(default_factory=list)
+
+
+@dataclass
+class DatasetStage:
+    dataset: Dataset
+    index_stages: list = field(default_factory=list)
+
+    @property
+    def cells(self) -> list:
+        return [cell for stage in self.index_stages for cell in stage.cells]
+
+
+@dataclass
+class MatrixSpec:
+    sizes: list
+    departments: list
+    join_methods: list = field(default_factory=lambda: list(JOIN_METHODS))
+    index_sets: list = field(default_factory=lambda: list(INDEX_SETS))
+    queries: list = field(default_factory=lambda: list(JOIN_QUERIES))
+    seeds: list = field(default_factory=lambda: [42])
+    gucs: list = field(default_factory=lambda: [{}])
+    # GUC name -> values; every combination is applied on top of each entry of gucs
+    guc_sweep: dict = field(default_factory=dict)
+    distributions: list = field(default_factory=lambda: [Distribution()])
+    measurement: dict = field(default_factory=dict)
+
+    def validate(self):
+        for name, values, known in (('join_methods', self.join_methods, JOIN_METHODS + [PLANNER_CHOICE]),
+                                    ('index_sets', self.index_sets, INDEX_SETS),
+                                    ('queries', self.queries, JOIN_QUERIES)):
+            unknown = [value for value in values if value not in known]
+            if unknown:
+                raise ValueError(f"Unknown {name} {unknown}; expected some of {list(known)}")
+        for settings in self.gucs + [self.guc_sweep]:
+            for guc in settings:
+                if not guc.replace('_', '').replace('.', '').isalnum():
+                    raise ValueError(f"Invalid GUC name {guc!r}")
+
+    def settings_combinations(self) -> list:
+        names = sorted(self.guc_sweep)
+        return [{**settings, **dict(zip(names, values))} for settings in self.gucs
+                for values in itertools.product(*(self.guc_sweep[name] for name in names))]
+
+
+def load_spec(path: str = DEFAULT_SPEC) -> MatrixSpec:
+    """Reads a matrix spec from TOML, or from YAML when PyYAML is installed."""
+    if path.endswith(('.yaml', '.yml')):
+        import yaml
+        with open(path) as spec_file:
+            document = yaml.safe_load(spec_file)
+    else:
+        import tomllib
+        with open(path, 'rb') as spec_file:
+            document = tomllib.load(spec_file)
+
+    matrix = dict(document['matrix'])
+    spec = MatrixSpec(
+        sizes=matrix.pop('sizes'),
+        departments=matrix.pop('departments'),
+        measurement=document.get('measurement', {}),
+        **matrix,
+    )
+    spec.gucs = [{name: str(value) for name, value in settings.items()} for settings in spec.gucs] or [{}]
+    spec.guc_sweep = {name: [str(value) for value in values] for name, values in spec.guc_sweep.items()}
+    spec.distributions = [Distribution(**settings) if isinstance(settings, dict) else settings
+                          for settings in spec.distributions] or [Distribution()]
+    spec.validate()
+    return spec
+
+
+def expand(spec: MatrixSpec) -> list:
+    """All distinct cells of the matrix."""
+    cells = set()
+    for size, departments, seed, distribution, index_set, query, join_method, settings in itertools.product(
+            spec.sizes, spec.departments, spec.seeds, spec.distributions, spec.index_sets, spec.queries,
+            spec.join_methods, spec.settings_combinations()):
+        cells.add(Cell(Dataset(size, departments, seed, distribution), index_set, query, join_method,
+                       tuple(sorted(settings.items()))))
+    return list(cells)
+
+
+def plan(spec: MatrixSpec) -> list:
+    """Orders the cells so each dataset is loaded once and each index set is built once per dataset.
+
+    Datasets run smallest first, so the estimate for the next, larger one
+    can be checked against reality early in the run.
+    """
+    stages = {}
+    for cell in expand(spec):
+        stage = stages.setdefault(cell.dataset, DatasetStage(cell.dataset))
+        index_stage = next((s for s in stage.index_stages if s.index_set == cell.index_set), None)
+        if index_stage is None:
+            index_stage = IndexStage(cell.index_set)
+            stage.index_stages.append(index_stage)
+        index_stage.cells.append(cell)
+
+    index_order = {name: position for position, name in enumerate(INDEX_SETS)}
+    query_order = {name: position for position, name in enumerate(JOIN_QUERIES)}
+    method_order = {name: position for position, name in enumerate(JOIN_METHODS + [PLANNER_CHOICE])}
+    ordered = sorted(stages.values(), key=lambda stage: (stage.dataset.num_employees,
+                                                         stage.dataset.num_departments, stage.dataset.seed,
+                                                         stage.dataset.distribution.label()))
+    for stage in ordered:
+        stage.index_stages.sort(key=lambda index_stage: index_order[index_stage.index_set])
+        for index_stage in stage.index_stages:
+            index_stage.cells.sort(key=lambda cell: (query_order[cell.query], cell.gucs,
+                                                     method_order[cell.join_method]))
+    return ordered
+
+
+def estimate_query_seconds(cell: Cell, fetch_mode: str = 'fetchall') -> float:
+    """Crude per-execution cost model of the join, good to an order of magnitude."""
+    n, m = cell.dataset.num_employees, cell.dataset.num_departments
+    indexed = bool(INDEX_SETS[cell.index_set])
+    if cell.query != 'on' or cell.join_method == 'nestloop':
+        # Non-equi joins always end up as a nested loop; an index only helps the equi-join
+        if cell.query == 'on' and indexed:
+            server = SECONDS_PER_ROW * n * max(math.log2(m), 1)
+        else:
+            server = SECONDS_PER_ROW * n + SECONDS_PER_PAIR * n * m
+    elif cell.join_method == 'mergejoin':
+        server = SECONDS_PER_ROW * n * max(math.log2(n), 1) / 4
+    else:
+        server = SECONDS_PER_ROW * (n + m)
+    if fetch_mode == 'count':
+        return server
+    result_rows = n * min(RESULT_ROWS_PER_EMPLOYEE.get(cell.query, 1), m)
+    return server + SECONDS_PER_RESULT_ROW * result_rows
+
+
+def estimate_runtime(stages: list, measurement: dict = None, verify: bool = False) -> dict:
+    measurement = measurement or {}
+    # Warm-up runs, the first of which captures the plan and the last sizes the result, and the expected timed runs
+    runs_per_cell = measurement.get('warmup', 2) + measurement.get('min_iterations', 5)
+    estimate = {'load': 0.0, 'index': 0.0, 'query': 0.0, 'cells': 0}
+    for stage in stages:
+        dataset = stage.dataset
+        estimate['load'] += (dataset.num_employees + dataset.num_departments) / LOAD_ROWS_PER_SECOND + CLONE_SECONDS
+        for index_stage in stage.index_stages:
+            if INDEX_SETS[index_stage.index_set]:
+                estimate['index'] += dataset.num_employees / INDEX_ROWS_PER_SECOND
+            for cell in index_stage.cells:
+                estimate['query'] += runs_per_cell * estimate_query_seconds(cell, measurement.get('fetch', 'fetchall'))
+                if verify:
+                    # The fingerprint runs the query once more, reduced on the server like a count
+                    estimate['query'] += estimate_query_seconds(cell, 'count')
+                estimate['cells'] += 1
+    estimate['total'] = estimate['load'] + estimate['index'] + estimate['query']
+    return estimate
+
+
+def describe(stages: list, estimate: dict) -> str:
+    lines = []
+    for stage in stages:
+        lines.append(f"dataset {stage.dataset.key}: load once")
+        for index_stage in stage.index_stages:
+            lines.append(f"  index set '{index_stage.index_set}': build once, {len(index_stage.cells)} cells")
+    lines.append(f"{estimate['cells']} cells, estimated {estimate['total']:.0f} s "
+                 f"(load {estimate['load']:.0f} s, indexes {estimate['index']:.0f} s, queries {estimate['query']:.0f} s)")
+    return "\n".join(lines)
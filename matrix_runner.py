@@ -0,0 +1,199 @@
+import time
+from dataclasses import dataclass
+
+from sqlalchemy import text
+
+from backends import backend_for
+from budget import Censored, RuntimeBudget
+from data_generator import DataGenerator
+from explain import QueryPlan
+from fetch import ResultFetcher
+from fingerprint import Fingerprint, ResultVerifier
+from guc_sweep import format_guc_report
+from matrix_planner import Cell, MatrixSpec, describe, estimate_runtime, plan
+from measurement import Measurement, MeasurementEngine
+from queries import INDEX_SETS, JOIN_QUERIES, drop_index_statements
+from results_store import ResultsStore
+
+MEASUREMENT_OPTIONS = ('warmup', 'min_iterations', 'max_iterations', 'target_relative_error', 'confidence',
+                       'outliers', 'cache_mode', 'cold_cache_command', 'prewarm_relations', 'server_stats')
+
+
+@dataclass
+class CellResult:
+    cell: Cell
+    measurement: Measurement = None
+    plan: QueryPlan = None
+    error: str = None
+    fingerprint: Fingerprint = None
+    mismatch: bool = False
+    censored: Censored = None
+
+
+def growth_key(cell: Cell) -> str:
+    """The cell's key without its employee count, so the same cell can be followed across dataset sizes."""
+    return cell.key[len(str(cell.dataset.num_employees)):]
+
+
+class MatrixRunner:
+    """Executes a planned benchmark matrix.
+
+    Each dataset is cloned from the fixture cache once, each index set is
+    built once on it, and every cell sharing that state runs before the
+    indexes are dropped and the clone is discarded.
+
+    The backend follows from db_url. Cells it can't run, such as a join
+    method the engine can't be made to use, are skipped and listed.
+
+    With a verifier, every cell's result is fingerprinted and compared with
+    the other cells running the same query on the same dataset, whatever
+    their join method, indexes or settings. Cells that disagree are
+    recorded as mismatches; the verifier's raise_for_mismatches fails the
+    run once everything has been recorded.
+
+    With a budget, each dataset is a scenario with its own time budget;
+    cells that are predicted not to fit in what is left of it, or that run
+    out of it, are recorded as censored.
+    """
+
+    def __init__(self, db_url: str, spec: MatrixSpec, verbose: bool = True, results_store: ResultsStore = None,
+                 run_id: str = None, verifier: ResultVerifier = None, budget: RuntimeBudget = None):
+        self.db_url = db_url
+        self.spec = spec
+        self.verbose = verbose
+        self.results_store = results_store
+        self.run_id = run_id
+        self.verifier = verifier
+        self.budget = budget
+        self.backend = backend_for(db_url)
+        self.fixture_cache = self.backend.fixture_cache(verbose=verbose)
+        self.skipped = []
+
+    def measurement_engine(self, engine) -> MeasurementEngine:
+        options = {name: value for name, value in self.spec.measurement.items() if name in MEASUREMENT_OPTIONS}
+        if 'prewarm_relations' in options:
+            options['prewarm_relations'] = tuple(options['prewarm_relations'])
+        fetcher = ResultFetcher(self.spec.measurement.get('fetch', 'fetchall'),
+                                self.spec.measurement.get('batch_size', 10000))
+        return MeasurementEngine(engine, fetcher=fetcher, **options)
+
+    def apply_settings(self, connection, cell: Cell):
+        self.backend.apply_join_method(connection, cell.join_method)
+        for name, value in cell.gucs:
+            connection.execute(text("SELECT set_config(:name, :value, false)"), {'name': name, 'value': value})
+
+    def reset_settings(self, connection):
+        self.backend.reset_settings(connection)
+
+    def run_cell(self, connection, measurement_engine: MeasurementEngine, cell: Cell,
+                 scenario_budget=None) -> CellResult:
+        name, query = JOIN_QUERIES[cell.query]
+
+        def measure():
+            # The plan is captured as the first warm-up run instead of running the query once more
+            measurement = measurement_engine.measure(connection, query, explain=self.backend.capture_plan)
+            return measurement, measurement.plan
+
+        try:
+            self.apply_settings(connection, cell)
+            if scenario_budget is None:
+                measurement, query_plan = measure()
+            else:
+                measurement, query_plan = scenario_budget.run(
+                    connection, growth_key(cell), cell.dataset.num_employees,
+                    measurement_engine.warmup + measurement_engine.min_iterations, measure)
+            result = CellResult(cell, measurement, query_plan)
+            if self.verifier is not None:
+                group = f"{cell.dataset.key}/{cell.query}"
+                result.fingerprint = self.verifier.check(connection, group, cell.key, query)
+                result.mismatch = self.verifier.mismatched(cell.key, group)
+        except Censored as censored:
+            result = CellResult(cell, error=f"censored: {censored}", censored=censored)
+        except Exception as error:
+            connection.rollback()
+            result = CellResult(cell, error=f"{type(error).__name__}: {error}")
+        self.reset_settings(connection)
+        self.record(result)
+        if self.verbose:
+            print(f"{cell.key}: {result.measurement if result.error is None else result.error}")
+        return result
+
+    def record(self, result: CellResult):
+        if self.results_store is None:
+            return
+        cell = result.cell
+        context = {'backend': self.backend.name, 'num_employees': cell.dataset.num_employees,
+                   'num_departments': cell.dataset.num_departments, 'seed': cell.dataset.seed,
+                   'dataset': cell.dataset.key, 'index_set': cell.index_set,
+                   'query': cell.query, 'join_method': cell.join_method, 'gucs': dict(cell.gucs),
+                   'fetch': self.spec.measurement.get('fetch', 'fetchall')}
+        if result.fingerprint is not None:
+            context['fingerprint'] = {'rows': result.fingerprint.rows, 'digest': result.fingerprint.digest}
+        status = 'mismatch' if result.mismatch else None
+        if result.censored is not None:
+            context.update(result.censored.context())
+            status = 'censored'
+        self.results_store.record(self.run_id, cell.key, result.measurement, result.plan, context=context,
+                                  error=result.error, status=status)
+
+    def run_stage(self, stage) -> list:
+        results = []
+        generator = DataGenerator(stage.dataset.num_employees, stage.dataset.num_departments,
+                                  seed=stage.dataset.seed, distribution=stage.dataset.distribution)
+        with self.fixture_cache.clone(generator) as clone_url:
+            if self.results_store is not None:
+                self.results_store.record_dataset(self.run_id, generator,
+                                                  self.fixture_cache.stats(generator, clone_url))
+            engine = self.backend.create_engine(clone_url)
+            measurement_engine = self.measurement_engine(engine)
+            scenario_budget = self.budget.scenario() if self.budget is not None else None
+            try:
+                with engine.connect() as connection:
+                    for index_stage in stage.index_stages:
+                        for statement in INDEX_SETS[index_stage.index_set]:
+                            connection.execute(text(statement))
+                        connection.execute(text("ANALYZE"))
+                        connection.commit()
+                        for cell in index_stage.cells:
+                            reason = self.backend.unsupported(cell.join_method, cell.gucs)
+                            if reason:
+                                self.skipped.append((cell, reason))
+                                continue
+                            results.append(self.run_cell(connection, measurement_engine, cell, scenario_budget))
+                        for statement in drop_index_statements(index_stage.index_set):
+                            connection.execute(text(statement))
+                        connection.commit()
+            finally:
+                engine.dispose()
+        return results
+
+    def run(self) -> list:
+        stages = plan(self.spec)
+        estimate = estimate_runtime(stages, self.spec.measurement, verify=self.verifier is not None)
+        if self.verbose:
+            print(describe(stages, estimate))
+
+        start_time = time.perf_counter()
+        results = []
+        for stage in stages:
+            results.extend(self.run_stage(stage))
+        elapsed = time.perf_counter() - start_time
+
+        if self.verbose:
+            print("--------------------------------------------------")
+            for result in results:
+                if result.censored:
+                    print(f"{result.cell.key}: CENSORED {result.censored}")
+                elif result.error:
+                    print(f"{result.cell.key}: FAILED {result.error}")
+                else:
+                    print(f"{result.cell.key}: median {result.measurement.median_ms:.3f} ms, "
+                          f"p95 {result.measurement.p95_ms:.3f} ms, plan {result.plan.join_methods()}")
+            if self.skipped:
+                print(f"Skipped {len(self.skipped)} cells: "
+                      f"{', '.join(sorted({reason for _, reason in self.skipped}))}")
+            guc_report = format_guc_report(results)
+            if guc_report:
+                print(guc_report)
+            print(f"Finished {len(results)} cells in {elapsed:.0f} s (estimated {estimate['total']:.0f} s)")
+        return results
@@ -0,0 +1,317 @@
+import math
+import statistics
+import subprocess
+import time
+from dataclasses import dataclass, field
+
+from sqlalchemy import text
+
+from fetch import ResultFetcher
+from profiler import traced
+from server_stats import ServerStatsCollector, format_server_stats
+
+CACHE_MODES = ('warm', 'cold')
+OUTLIER_METHODS = (None, 'iqr', 'mad')
+
+# Two-sided Student t critical values for small samples; larger samples use the normal quantile
+T_CRITICAL = {
+    0.95: {1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306, 9: 2.262,
+           10: 2.228, 12: 2.179, 15: 2.131, 20: 2.086, 25: 2.060, 30: 2.042, 40: 2.021, 60: 2.000,
+           120: 1.980},
+    0.99: {1: 63.657, 2: 9.925, 3: 5.841, 4: 4.604, 5: 4.032, 6: 3.707, 7: 3.499, 8: 3.355, 9: 3.250,
+           10: 3.169, 12: 3.055, 15: 2.947, 20: 2.845, 25: 2.787, 30: 2.750, 40: 2.704, 60: 2.660,
+           120: 2.617},
+}
+
+
+def t_critical(confidence: float, degrees_of_freedom: int) -> float:
+    table = T_CRITICAL.get(confidence)
+    if table is None or degrees_of_freedom > max(table):
+        return statistics.NormalDist().inv_cdf(0.5 + confidence / 2)
+    # Use the next tabulated row down, which is conservative
+    return table[max(df for df in table if df <= max(degrees_of_freedom, 1))]
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return float('nan')
+    position = (len(sorted_values) - 1) * fraction
+    lower = math.floor(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def split_outliers(samples: list, method: str):
+    """Returns (kept, outliers) using Tukey fences ('iqr') or a modified z-score ('mad')."""
+    if method is None or len(samples) < 4:
+        return list(samples), []
+    ordered = sorted(samples)
+    if method == 'iqr':
+        q1, q3 = percentile(ordered, 0.25), percentile(ordered, 0.75)
+        low, high = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+    elif method == 'mad':
+        median = statistics.median(ordered)
+        mad = statistics.median(abs(value - median) for value in ordered)
+        if mad == 0:
+            return list(samples), []
+        low, high = median - 3.5 * mad / 0.6745, median + 3.5 * mad / 0.6745
+    else:
+        raise ValueError(f"outliers must be one of {OUTLIER_METHODS}, got {method!r}")
+    kept = [value for value in samples if low <= value <= high]
+    return kept, [value for value in samples if not low <= value <= high]
+
+
+@dataclass
+class Measurement:
+    query: str
+    samples_ns: list
+    outliers_ns: list = field(default_factory=list)
+    confidence: float = 0.95
+    cache_mode: str = 'warm'
+    converged: bool = False
+    fetch_mode: str = 'fetchall'
+    rows: int = 0
+    bytes_transferred: int = 0
+    # Server counter deltas over the timed iterations, see server_stats
+    server_stats: dict = None
+    # Plan captured by measure's explain in place of the first warm-up run
+    plan: object = None
+
+    def _ms(self, nanoseconds: float) -> float:
+        return nanoseconds / 1e6
+
+    @property
+    def iterations(self) -> int:
+        return len(self.samples_ns) + len(self.outliers_ns)
+
+    @property
+    def min_ms(self) -> float:
+        return self._ms(min(self.samples_ns))
+
+    @property
+    def max_ms(self) -> float:
+        return self._ms(max(self.samples_ns))
+
+    @property
+    def mean_ms(self) -> float:
+        return self._ms(statistics.fmean(self.samples_ns))
+
+    @property
+    def median_ms(self) -> float:
+        return self._ms(statistics.median(self.samples_ns))
+
+    @property
+    def p95_ms(self) -> float:
+        return self._ms(percentile(sorted(self.samples_ns), 0.95))
+
+    @property
+    def p99_ms(self) -> float:
+        return self._ms(percentile(sorted(self.samples_ns), 0.99))
+
+    @property
+    def stddev_ms(self) -> float:
+        return self._ms(statistics.stdev(self.samples_ns)) if len(self.samples_ns) > 1 else 0.0
+
+    @property
+    def mean_ci_ms(self) -> tuple:
+        n = len(self.samples_ns)
+        if n < 2:
+            return self.mean_ms, self.mean_ms
+        half_width = t_critical(self.confidence, n - 1) * self.stddev_ms / math.sqrt(n)
+        return self.mean_ms - half_width, self.mean_ms + half_width
+
+    @property
+    def median_ci_ms(self) -> tuple:
+        # Distribution-free interval from order statistics (normal approximation to the binomial)
+        ordered = sorted(self.samples_ns)
+        n = len(ordered)
+        z = statistics.NormalDist().inv_cdf(0.5 + self.confidence / 2)
+        low = max(0, math.floor(n / 2 - z * math.sqrt(n) / 2))
+        high = min(n - 1, math.ceil(n / 2 + z * math.sqrt(n) / 2) - 1)
+        return self._ms(ordered[low]), self._ms(ordered[high])
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / (self.median_ms / 1000) if self.median_ms else float('inf')
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.bytes_transferred / 1e6 / (self.median_ms / 1000) if self.median_ms else float('inf')
+
+    @property
+    def relative_error(self) -> float:
+        low, high = self.mean_ci_ms
+        return (high - low) / 2 / self.mean_ms if self.mean_ms else float('inf')
+
+    def summary(self) -> dict:
+        return {
+            'iterations': self.iterations,
+            'outliers': len(self.outliers_ns),
+            'min_ms': self.min_ms,
+            'median_ms': self.median_ms,
+            'mean_ms': self.mean_ms,
+            'p95_ms': self.p95_ms,
+            'p99_ms': self.p99_ms,
+            'max_ms': self.max_ms,
+            'stddev_ms': self.stddev_ms,
+            'mean_ci_ms': self.mean_ci_ms,
+            'median_ci_ms': self.median_ci_ms,
+            'relative_error': self.relative_error,
+            'converged': self.converged,
+            'cache_mode': self.cache_mode,
+            'fetch_mode': self.fetch_mode,
+            'rows': self.rows,
+            'bytes_transferred': self.bytes_transferred,
+            'rows_per_second': self.rows_per_second,
+            'mb_per_second': self.mb_per_second,
+            'server_stats': self.server_stats,
+        }
+
+    def __str__(self):
+        low, high = self.median_ci_ms
+        return (f"median {self.median_ms:.4f} ms [{low:.4f}, {high:.4f}] "
+                f"min {self.min_ms:.4f} p95 {self.p95_ms:.4f} p99 {self.p99_ms:.4f} "
+                f"stddev {self.stddev_ms:.4f} ms, n={len(self.samples_ns)} "
+                f"(+{len(self.outliers_ns)} outliers), rel.err {self.relative_error:.1%}, {self.cache_mode} cache, "
+                f"{self.fetch_mode}: {self.rows} rows, {self.bytes_transferred / 1e6:.2f} MB, "
+                f"{self.rows_per_second:,.0f} rows/s, {self.mb_per_second:.2f} MB/s"
+                + ("" if self.converged else ", not converged")
+                + (f"; server: {format_server_stats(self.server_stats)}" if self.server_stats else ""))
+
+
+class MeasurementEngine:
+    """Repeats a query until its timing is statistically stable.
+
+    After the warm-up runs, timed iterations continue until the confidence
+    interval of the mean is within target_relative_error of the mean (or
+    max_iterations is reached). In 'cold' mode every iteration first runs
+    DISCARD ALL, and, when cold_cache_command is given (for example a script
+    that restarts the server and drops the OS page cache), that command too,
+    followed by a fresh connection with the caller's session settings.
+
+    With server_stats, server counters are snapshotted around the timed
+    iterations and their deltas kept on the measurement. This is skipped with
+    a cold_cache_command, which may restart the server and reset them, and
+    on engines other than PostgreSQL, which keep no such counters.
+    """
+
+    def __init__(self, engine, warmup: int = 2, min_iterations: int = 5, max_iterations: int = 50,
+                 target_relative_error: float = 0.05, confidence: float = 0.95, outliers: str = 'iqr',
+                 cache_mode: str = 'warm', cold_cache_command: str = None, prewarm_relations: tuple = (),
+                 fetcher: ResultFetcher = None, server_stats: bool = True):
+        if cache_mode not in CACHE_MODES:
+            raise ValueError(f"cache_mode must be one of {CACHE_MODES}, got {cache_mode!r}")
+        if outliers not in OUTLIER_METHODS:
+            raise ValueError(f"outliers must be one of {OUTLIER_METHODS}, got {outliers!r}")
+        self.engine = engine
+        self.warmup = warmup
+        self.min_iterations = max(min_iterations, 2)
+        self.max_iterations = max(max_iterations, self.min_iterations)
+        self.target_relative_error = target_relative_error
+        self.confidence = confidence
+        self.outliers = outliers
+        self.cache_mode = cache_mode
+        self.cold_cache_command = cold_cache_command
+        self.prewarm_relations = prewarm_relations
+        self.fetcher = fetcher or ResultFetcher()
+        self.server_stats = server_stats and not cold_cache_command
+        self._server_stats_collector = None
+
+    def prewarm(self, connection):
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_prewarm"))
+        for relation in self.prewarm_relations:
+            connection.execute(text("SELECT pg_prewarm(:relation)"), {'relation': relation})
+
+    def session_settings(self, connection) -> list:
+        rows = connection.execute(text("SELECT name, setting FROM pg_settings WHERE source = 'session'"))
+        return list(rows)
+
+    def run_once(self, connection, query: str, parameters: dict = None) -> tuple:
+        start_time = time.perf_counter_ns()
+        rows = self.fetcher.run(connection, query, parameters)
+        return time.perf_counter_ns() - start_time, rows
+
+    def discard_all(self, connection):
+        # DISCARD ALL refuses to run inside the transaction SQLAlchemy opens implicitly
+        connection.commit()
+        driver_connection = connection.connection.driver_connection
+        autocommit = driver_connection.autocommit
+        driver_connection.autocommit = True
+        try:
+            with driver_connection.cursor() as cursor:
+                cursor.execute("DISCARD ALL")
+        finally:
+            driver_connection.autocommit = autocommit
+
+    def _cold_run(self, connection, query: str, settings: list, parameters: dict = None) -> tuple:
+        self.discard_all(connection)
+        if not self.cold_cache_command:
+            for name, setting in settings:
+                connection.execute(text("SELECT set_config(:name, :setting, false)"),
+                                   {'name': name, 'setting': setting})
+            return self.run_once(connection, query, parameters)
+
+        subprocess.run(self.cold_cache_command, shell=True, check=True)
+        self.engine.dispose()
+        with self.engine.connect() as fresh_connection:
+            for name, setting in settings:
+                fresh_connection.execute(text("SELECT set_config(:name, :setting, false)"),
+                                         {'name': name, 'setting': setting})
+            return self.run_once(fresh_connection, query, parameters)
+
+    @traced('measure')
+    def measure(self, connection, query: str, parameters: list = None, explain=None) -> Measurement:
+        """Times the query; with a list of parameter dicts, iteration i binds parameters[i % len(parameters)].
+
+        explain, such as a backend's capture_plan, is called with the
+        connection and query as the first warm-up run, so capturing the plan
+        doesn't execute the query once more; its plan is kept on the
+        measurement. The result is sized during the last warm-up run, and
+        left at 0 bytes when no plain warm-up run remains.
+        """
+        parameters = parameters or [None]
+        postgres = connection.dialect.name == 'postgresql'
+        if not postgres and (self.cache_mode == 'cold' or self.prewarm_relations):
+            raise ValueError("cold caches and prewarming need PostgreSQL")
+        settings = self.session_settings(connection) if self.cache_mode == 'cold' else []
+        if self.cache_mode == 'warm' and self.prewarm_relations:
+            self.prewarm(connection)
+        plan = explain(connection, query) if explain is not None else None
+        warmups = self.warmup - (explain is not None)
+        bytes_transferred = 0
+        for iteration in range(warmups):
+            bound = parameters[iteration % len(parameters)]
+            if iteration == warmups - 1:
+                _, bytes_transferred = self.fetcher.run_sized(connection, query, bound)
+            else:
+                self.run_once(connection, query, bound)
+
+        if self.server_stats and postgres and self._server_stats_collector is None:
+            self._server_stats_collector = ServerStatsCollector(connection)
+        collector = self._server_stats_collector if self.server_stats and postgres else None
+        before = collector.snapshot(connection) if collector else None
+
+        samples = []
+        measurement = None
+        while len(samples) < self.max_iterations:
+            bound = parameters[len(samples) % len(parameters)]
+            if self.cache_mode == 'cold':
+                elapsed, rows = self._cold_run(connection, query, settings, bound)
+            else:
+                elapsed, rows = self.run_once(connection, query, bound)
+            samples.append(elapsed)
+            if len(samples) >= self.min_iterations:
+                kept, outliers = split_outliers(samples, self.outliers)
+                measurement = Measurement(query, kept, outliers, self.confidence, self.cache_mode)
+                if measurement.relative_error <= self.target_relative_error:
+                    measurement.converged = True
+                    break
+
+        if collector:
+            after = collector.snapshot(connection)
+            measurement.server_stats = collector.delta(before, after, measurement.iterations)
+        measurement.fetch_mode = self.fetcher.mode
+        measurement.plan = plan
+        measurement.rows = rows
+        measurement.bytes_transferred = bytes_transferred
+        return measurement
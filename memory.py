@@ -0,0 +1,82 @@
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+SAMPLE_INTERVAL = 0.01
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes."""
+    if sys.platform.startswith('linux'):
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        # Lifetime peak is the best we can do without /proc or psutil
+        scale = 1 if sys.platform == 'darwin' else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def _reset_kernel_peak() -> bool:
+    # Writing 5 to clear_refs resets VmHWM on Linux >= 4.0
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _kernel_peak() -> int:
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+class PeakRSSTracker:
+    """Records the peak resident memory of the process for each named phase.
+
+    The kernel high-water mark is reset at the start of every phase where the
+    platform allows it; a background sampler covers the remaining platforms.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.phases = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        kernel_peak = _reset_kernel_peak()
+        start_rss = current_rss()
+        peak = [start_rss]
+        stop = threading.Event()
+
+        def sample():
+            while not stop.wait(self.interval):
+                peak[0] = max(peak[0], current_rss())
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start_time
+            stop.set()
+            sampler.join()
+            peak_rss = max(peak[0], current_rss())
+            if kernel_peak:
+                peak_rss = max(peak_rss, _kernel_peak())
+            self.phases[name] = {'seconds': elapsed, 'start_rss': start_rss, 'peak_rss': peak_rss}
+
+    def report(self):
+        for name, stats in self.phases.items():
+            print(f"{name:<24} {stats['seconds']:>9.3f} s  peak RSS {stats['peak_rss'] / 2**20:>9.1f} MiB "
+                  f"(+{(stats['peak_rss'] - stats['start_rss']) / 2**20:.1f} MiB)")
@@ -1,6 +1,80 @@
+import os
+import re
 from abc import ABC, abstractmethod
+from contextlib import nullcontext
+
+from budget import Censored
 
 class PerformanceTest(ABC):
+    # Held around the timed section; the scenario runner swaps in a shared lock for quiet mode
+    timing_lock = nullcontext()
+    # Set by the caller to keep every measurement in the results store
+    results_store = None
+    run_id = None
+    # When set, figures are saved here instead of opened in a window, so unattended runs never block
+    figure_dir = None
+    # Set by the caller to fingerprint every result and compare it across join methods and indexes
+    verifier = None
+    # Set by the caller to a ScenarioBudget, which bounds the time the test may spend measuring
+    budget = None
+    # Names of the backends the test can run on, or None for all of them
+    backends = None
+
+    @classmethod
+    def unsupported(cls, backend) -> str:
+        """Why the test can't run on the backend, or None when it can."""
+        if cls.backends is not None and backend.name not in cls.backends:
+            return f"{cls.__name__} needs {' or '.join(cls.backends)}, not {backend.name}"
+        return None
+
+    def show_figure(self, fig, title: str):
+        import matplotlib.pyplot as plt
+        if self.figure_dir is None:
+            plt.show()
+            return
+        os.makedirs(self.figure_dir, exist_ok=True)
+        fig.savefig(os.path.join(self.figure_dir, re.sub(r'[^A-Za-z0-9]+', '_', title).strip('_').lower() + '.png'))
+        plt.close(fig)
+
+    @property
+    def scope(self) -> str:
+        return f"{type(self).__name__}/{self.num_employees}x{self.num_departments}"
+
+    def verify_result(self, connection, name: str, label: str, query: str):
+        """Fingerprints a result of the named query and compares it with the query's earlier results in this test."""
+        if self.verifier is None:
+            return None
+        return self.verifier.check(connection, f"{self.scope}/{name}", label, query)
+
+    def measure_within_budget(self, connection, name: str, query: str) -> tuple:
+        """measure_execution within the scenario's budget, or (None, None) once the result is censored and recorded."""
+        if self.budget is None:
+            return self.measure_execution(query, connection)
+        # The plan is captured as a warm-up run, so these are all the runs a measurement takes at least
+        runs = self.measurement.warmup + self.measurement.min_iterations
+        try:
+            return self.budget.run(connection, f"{type(self).__name__}/{self.num_departments}/{name}",
+                                   self.num_employees, runs, lambda: self.measure_execution(query, connection))
+        except Censored as censored:
+            print(f"{name}: censored, {censored}")
+            if self.results_store is not None:
+                self.results_store.record(self.run_id, f"{self.scope}/{name}", status='censored', error=str(censored),
+                                          context={'test': type(self).__name__, 'num_employees': self.num_employees,
+                                                   'num_departments': self.num_departments, **censored.context()})
+            return None, None
+
+    def record_results(self, execution_results: list):
+        if self.results_store is None:
+            return
+        for name, measurement, plan, join_method, *_ in execution_results:
+            scenario_key = f"{self.scope}/{name}"
+            mismatched = self.verifier is not None and self.verifier.mismatched(name, f"{self.scope}/")
+            self.results_store.record(self.run_id, scenario_key, measurement, plan,
+                                      status='mismatch' if mismatched else None,
+                                      context={'test': type(self).__name__, 'num_employees': self.num_employees,
+                                               'num_departments': self.num_departments,
+                                               'join_method': join_method})
+
     @abstractmethod
     def generate_data(self, num_employees: int, num_departments: int):
         pass
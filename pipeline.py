@@ -0,0 +1,133 @@
+import queue
+import threading
+import time
+
+from bulk_loader import BulkLoader, LoadStats, PGCOPY_HEADER, PGCOPY_TRAILER, TABLE_SCHEMAS
+from data_generator import DataGenerator
+from memory import PeakRSSTracker
+from profiler import traced
+
+DEFAULT_QUEUE_SIZE = 4
+
+_END_OF_STREAM = object()
+
+
+class _QueueReader:
+    """File-like view over a queue of encoded chunks, consumed by COPY FROM STDIN."""
+
+    def __init__(self, chunks: queue.Queue):
+        self.chunks = chunks
+        self.buffer = memoryview(b'')
+        self.finished = False
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        while not self.buffer and not self.finished:
+            chunk = self.chunks.get()
+            if chunk is _END_OF_STREAM:
+                self.finished = True
+            elif isinstance(chunk, BaseException):
+                raise chunk
+            else:
+                self.buffer = memoryview(chunk)
+        if size is None or size < 0:
+            size = len(self.buffer)
+        data = bytes(self.buffer[:size])
+        self.buffer = self.buffer[size:]
+        self.bytes_read += len(data)
+        return data
+
+    readline = read
+
+
+class StreamingPipeline:
+    """Generates employees in fixed-size chunks and streams them into one COPY.
+
+    A producer thread generates and encodes the next chunk while the current
+    one is being sent, and the bounded queue between them caps client memory
+    at roughly (queue_size + 2) chunks regardless of the table size.
+    """
+
+    def __init__(self, engine, generator: DataGenerator, loader: BulkLoader = None,
+                 queue_size: int = DEFAULT_QUEUE_SIZE, verbose: bool = True):
+        self.engine = engine
+        self.generator = generator
+        self.loader = loader or BulkLoader(engine, verbose=False)
+        self.queue_size = queue_size
+        self.verbose = verbose
+        self.memory = PeakRSSTracker()
+        self.producer_seconds = 0.0
+
+    @staticmethod
+    def _put(chunks: queue.Queue, item, stop: threading.Event) -> bool:
+        """Puts item on the queue unless stopped first; False if it was not put."""
+        # Poll so a failed consumer can't leave us blocked on a full queue
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _produce(self, chunks: queue.Queue, columns: list, stop: threading.Event):
+        try:
+            binary = self.loader.copy_format == 'binary'
+            first = True
+            busy_start = time.perf_counter()
+            for employees_chunk in self.generator.iter_employee_chunks():
+                payload = self.loader.encode(employees_chunk, columns, header=first, trailer=False)
+                first = False
+                self.producer_seconds += time.perf_counter() - busy_start
+                if not self._put(chunks, payload, stop):
+                    return
+                busy_start = time.perf_counter()
+            if binary and not self._put(chunks, (PGCOPY_HEADER if first else b'') + PGCOPY_TRAILER, stop):
+                return
+            self._put(chunks, _END_OF_STREAM, stop)
+        except BaseException as error:
+            self._put(chunks, error, stop)
+
+    def _stream_employees(self, cursor) -> LoadStats:
+        columns = TABLE_SCHEMAS['employees'] + self.generator.extra_employee_columns()
+        start_time = time.perf_counter()
+        self.loader.create_table(cursor, 'employees', columns)
+
+        chunks = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        producer = threading.Thread(target=self._produce, args=(chunks, columns, stop), daemon=True)
+        producer.start()
+        reader = _QueueReader(chunks)
+        try:
+            cursor.copy_expert(self.loader.copy_statement('employees', columns), reader)
+        finally:
+            stop.set()
+            producer.join()
+        return LoadStats('employees', self.generator.num_employees, reader.bytes_read,
+                         time.perf_counter() - start_time)
+
+    @traced('load')
+    def run(self) -> list:
+        raw_connection = self.engine.raw_connection()
+        try:
+            with raw_connection.cursor() as cursor:
+                with self.memory.phase('departments'):
+                    departments_df = self.generator.generate_departments()
+                    stats = [self.loader.load_table(cursor, 'departments', departments_df)]
+                    del departments_df
+                with self.memory.phase('employees generate+copy'):
+                    stats.append(self._stream_employees(cursor))
+            raw_connection.commit()
+        finally:
+            raw_connection.close()
+
+        with self.memory.phase('analyze'):
+            self.loader.analyze(['departments', 'employees'])
+
+        if self.verbose:
+            for load_stats in stats:
+                print(f"Loaded {load_stats}")
+            print(f"Producer busy for {self.producer_seconds:.3f} s of "
+                  f"{self.memory.phases['employees generate+copy']['seconds']:.3f} s")
+            self.memory.report()
+        return stats
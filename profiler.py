@@ -0,0 +1,236 @@
+import cProfile
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict, dataclass
+
+from memory import _kernel_peak, _reset_kernel_peak, current_rss
+
+PROFILERS = ('cprofile', 'sample')
+SAMPLE_INTERVAL = 0.005
+PROFILE_DIR = os.path.join('results', 'profiles')
+
+_active = None
+
+
+def span(name: str):
+    """Times a phase of the harness when a PhaseProfiler is active, and does nothing otherwise."""
+    return _active.span(name) if _active is not None else nullcontext()
+
+
+def traced(name: str):
+    """Decorator running every call of the function inside span(name)."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@dataclass
+class SpanStats:
+    path: str
+    calls: int = 0
+    seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    db_seconds: float = 0.0
+    db_calls: int = 0
+    peak_traced_bytes: int = 0
+    peak_rss: int = 0
+
+    @property
+    def harness_seconds(self) -> float:
+        return max(self.seconds - self.db_seconds, 0.0)
+
+
+class _OpenSpan:
+    def __init__(self, path: str):
+        self.path = path
+        self.start_time = time.perf_counter()
+        self.start_cpu = time.process_time()
+        self.db_seconds = 0.0
+        self.db_calls = 0
+        self.peak_traced = 0
+        self.peak_rss = current_rss()
+
+
+class StackSampler:
+    """Samples the Python stacks of every other thread and counts them in folded form."""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = None
+        self._thread = None
+
+    def _sample(self):
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[";".join([names.get(ident, str(ident))] + frames[::-1])] += 1
+
+    def start(self):
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write_folded(self, path: str):
+        # One "frame;frame;frame count" line per stack, as read by flamegraph.pl and speedscope
+        with open(path, 'w') as folded:
+            for stack, count in self.stacks.most_common():
+                folded.write(f"{stack} {count}\n")
+
+
+class PhaseProfiler:
+    """Breaks a run of the harness down into named phases.
+
+    Each span records wall and CPU time, the time spent inside SQLAlchemy
+    cursor calls (so harness overhead is the rest; COPY through a raw DBAPI
+    cursor counts as harness time), and the peak traced
+    Python memory and peak RSS while it was open. Spans nest; their stats
+    are aggregated by path. One phase can additionally be profiled with
+    cProfile or a sampling profiler, written out for flame graph tools.
+
+    Tracing memory slows allocation-heavy code, so timings taken under the
+    profiler are not comparable with unprofiled runs.
+    """
+
+    def __init__(self, profile_phase: str = None, profiler: str = 'cprofile', trace_memory: bool = True,
+                 out_dir: str = PROFILE_DIR):
+        if profiler not in PROFILERS:
+            raise ValueError(f"profiler must be one of {PROFILERS}, got {profiler!r}")
+        self.profile_phase = profile_phase
+        self.profiler = profiler
+        self.trace_memory = trace_memory
+        self.out_dir = out_dir
+        self.stats = {}
+        self._open = []
+        self._kernel_peak = False
+        self._cprofile = cProfile.Profile() if profile_phase and profiler == 'cprofile' else None
+        self._sampler = StackSampler() if profile_phase and profiler == 'sample' else None
+
+    def __enter__(self):
+        global _active
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+        if self.trace_memory:
+            tracemalloc.start()
+        self._kernel_peak = _reset_kernel_peak()
+        _active = self
+        return self
+
+    def __exit__(self, *exc_info):
+        global _active
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+        _active = None
+        event.remove(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.remove(Engine, 'after_cursor_execute', self._after_cursor_execute)
+        if self.trace_memory:
+            tracemalloc.stop()
+        return False
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('profiler_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['profiler_start'].pop()
+        for open_span in self._open:
+            open_span.db_seconds += elapsed
+            open_span.db_calls += 1
+
+    def _fold_peaks(self):
+        # Peaks are reset whenever a span opens or closes, so carry the peak so far into every open span
+        traced = tracemalloc.get_traced_memory()[1] if self.trace_memory else 0
+        rss = max(current_rss(), _kernel_peak() if self._kernel_peak else 0)
+        for open_span in self._open:
+            open_span.peak_traced = max(open_span.peak_traced, traced)
+            open_span.peak_rss = max(open_span.peak_rss, rss)
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        if self._kernel_peak:
+            _reset_kernel_peak()
+
+    @contextmanager
+    def span(self, name: str):
+        self._fold_peaks()
+        path = "/".join([self._open[-1].path, name]) if self._open else name
+        open_span = _OpenSpan(path)
+        self._open.append(open_span)
+        profiling = name == self.profile_phase
+        if profiling and self._cprofile:
+            self._cprofile.enable()
+        elif profiling and self._sampler:
+            self._sampler.start()
+        try:
+            yield
+        finally:
+            if profiling and self._cprofile:
+                self._cprofile.disable()
+            elif profiling and self._sampler:
+                self._sampler.stop()
+            self._fold_peaks()
+            self._open.pop()
+            stats = self.stats.setdefault(path, SpanStats(path))
+            stats.calls += 1
+            stats.seconds += time.perf_counter() - open_span.start_time
+            stats.cpu_seconds += time.process_time() - open_span.start_cpu
+            stats.db_seconds += open_span.db_seconds
+            stats.db_calls += open_span.db_calls
+            stats.peak_traced_bytes = max(stats.peak_traced_bytes, open_span.peak_traced)
+            stats.peak_rss = max(stats.peak_rss, open_span.peak_rss)
+
+    def instrument(self, target, *method_names):
+        """Wraps the named methods of target, typically a PerformanceTest, in spans of the same name."""
+        for method_name in method_names:
+            setattr(target, method_name, traced(method_name)(getattr(target, method_name)))
+        return target
+
+    def report(self) -> str:
+        lines = [f"{'phase':<40} {'calls':>6} {'wall s':>9} {'cpu s':>9} {'db s':>9} {'harness s':>9} "
+                 f"{'db calls':>8} {'py peak':>9} {'RSS peak':>9}"]
+        for stats in sorted(self.stats.values(), key=lambda stats: stats.path):
+            depth = stats.path.count("/")
+            lines.append(f"{'  ' * depth + stats.path.rsplit('/', 1)[-1]:<40} {stats.calls:>6} "
+                         f"{stats.seconds:>9.3f} {stats.cpu_seconds:>9.3f} {stats.db_seconds:>9.3f} "
+                         f"{stats.harness_seconds:>9.3f} {stats.db_calls:>8} "
+                         f"{stats.peak_traced_bytes / 2 ** 20:>6.1f} MiB {stats.peak_rss / 2 ** 20:>6.0f} MiB")
+        return "\n".join(lines)
+
+    def export(self) -> list:
+        """Writes the span table and, if a phase was profiled, its profile; returns the paths written."""
+        os.makedirs(self.out_dir, exist_ok=True)
+        paths = [os.path.join(self.out_dir, 'spans.json')]
+        with open(paths[0], 'w') as spans_file:
+            json.dump([dict(asdict(stats), harness_seconds=stats.harness_seconds)
+                       for stats in self.stats.values()], spans_file, indent=2)
+        if self._cprofile:
+            # Opens in snakeviz, or turns into a flame graph with flameprof
+            paths.append(os.path.join(self.out_dir, f"{self.profile_phase}.prof"))
+            self._cprofile.dump_stats(paths[-1])
+        if self._sampler:
+            paths.append(os.path.join(self.out_dir, f"{self.profile_phase}.folded"))
+            self._sampler.write_folded(paths[-1])
+        return paths
@@ -0,0 +1,43 @@
+JOIN_METHODS = ["nestloop", "hashjoin", "mergejoin"]
+# Leaves every join method enabled, for engines that can't be made to use a particular one
+PLANNER_CHOICE = "auto"
+
+JOIN_QUERIES = {
+    'on': ("Join using ON", "SELECT * FROM employees e JOIN departments d ON e.department_id = d.dept_id"),
+    'like': ("Join using LIKE", "SELECT * FROM employees e JOIN departments d ON CAST(e.department_id AS TEXT) LIKE CAST(d.dept_id AS TEXT) || '%'"),
+    'between': ("Join using BETWEEN", "SELECT * FROM employees e JOIN departments d ON e.department_id BETWEEN d.dept_id AND d.dept_id + 10"),
+}
+
+# Selective joins of the kind an application runs many times with different values: (label, SQL with
+# :named parameters, parameter name -> SQL type in the order PREPARE takes them)
+PARAMETERIZED_QUERIES = {
+    'department': ("Join ON one department",
+                   "SELECT * FROM employees e JOIN departments d ON e.department_id = d.dept_id "
+                   "WHERE d.dept_id = :dept_id",
+                   {'dept_id': 'integer'}),
+    'salary': ("Join ON salary range",
+               "SELECT * FROM employees e JOIN departments d ON e.department_id = d.dept_id "
+               "WHERE e.salary BETWEEN :low AND :high",
+               {'low': 'double precision', 'high': 'double precision'}),
+}
+
+# Same indexes JoinIndexTest builds, keyed by the label used in results
+INDEX_SETS = {
+    'without index': [],
+    'with index': [
+        "CREATE INDEX idx_employees_department_id ON employees(department_id);",
+        "CREATE INDEX idx_departments_dept_id ON departments(dept_id);",
+        "CREATE INDEX idx_departments_name ON departments(dept_name);",
+    ],
+}
+
+
+def join_method_settings(join_method: str) -> list:
+    """SET statements that leave only join_method enabled, or all of them for PLANNER_CHOICE."""
+    return [f"SET enable_{method} = {'on' if join_method in (method, PLANNER_CHOICE) else 'off'};"
+            for method in JOIN_METHODS]
+
+
+def drop_index_statements(index_set: str) -> list:
+    names = [statement.split()[2] for statement in INDEX_SETS[index_set]]
+    return [f"DROP INDEX IF EXISTS {name};" for name in names]
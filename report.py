@@ -0,0 +1,169 @@
+import html
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from dataset_stats import format_dataset_stats
+from results_store import DEFAULT_PATH, ResultsStore
+
+REPORT_DIR = os.path.join('results', 'reports')
+FIGURE_FORMATS = ('png', 'svg')
+
+
+def figure_key(scenario_key: str) -> tuple:
+    """Splits a scenario key into the figure it belongs to and its label within that figure."""
+    parts = scenario_key.split('/')
+    return '/'.join(parts[:2]), '/'.join(parts[2:]) or scenario_key
+
+
+def render_figure(stem: str, title: str, labels: list, samples_ms: list, formats: tuple) -> list:
+    """Draws the sample distribution of every scenario in one figure as horizontal box plots."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(10, 1.5 + 0.45 * len(labels)))
+    ax.boxplot(samples_ms, orientation='horizontal', showfliers=True)
+    ax.set_yticks(range(1, len(labels) + 1))
+    ax.set_yticklabels(labels, fontsize='small')
+    ax.set_xlabel('Time (ms)')
+    ax.set_title(title)
+    fig.tight_layout()
+    paths = []
+    for figure_format in formats:
+        path = f"{stem}.{figure_format}"
+        fig.savefig(path)
+        paths.append(path)
+    plt.close(fig)
+    return paths
+
+
+class ReportBuilder:
+    """Renders a stored run to figures and a single HTML summary, without any display.
+
+    Figures are drawn in a process pool when there are several of them;
+    matplotlib is only imported inside the workers.
+    """
+
+    def __init__(self, store: ResultsStore, out_dir: str = None, formats: tuple = FIGURE_FORMATS,
+                 jobs: int = None, baseline: str = None):
+        self.store = store
+        self.out_dir = out_dir
+        self.formats = formats
+        self.jobs = jobs or os.cpu_count() or 1
+        self.baseline = baseline
+
+    def figures(self, rows: list) -> dict:
+        groups = {}
+        for row in rows:
+            if row['status'] == 'ok' and row['samples_ns']:
+                group, label = figure_key(row['scenario_key'])
+                groups.setdefault(group, []).append((label, [sample / 1e6 for sample in row['samples_ns']]))
+        return groups
+
+    def render(self, groups: dict, figure_dir: str) -> dict:
+        os.makedirs(figure_dir, exist_ok=True)
+        jobs = []
+        for group, entries in groups.items():
+            stem = os.path.join(figure_dir, re.sub(r'[^A-Za-z0-9]+', '_', group).strip('_').lower())
+            jobs.append((group, (stem, group, [label for label, _ in entries], [samples for _, samples in entries],
+                                 self.formats)))
+        if self.jobs == 1 or len(jobs) <= 1:
+            return {group: render_figure(*arguments) for group, arguments in jobs}
+        with ProcessPoolExecutor(max_workers=min(self.jobs, len(jobs))) as executor:
+            futures = {group: executor.submit(render_figure, *arguments) for group, arguments in jobs}
+            return {group: future.result() for group, future in futures.items()}
+
+    def build(self, run: str = 'latest') -> str:
+        run_id = self.store.resolve(run)
+        out_dir = self.out_dir or os.path.join(REPORT_DIR, run_id)
+        rows = self.store.measurements(run_id)
+        figures = self.render(self.figures(rows), os.path.join(out_dir, 'figures'))
+        verdicts = {}
+        if self.baseline:
+            verdicts = {comparison.scenario_key: comparison
+                        for comparison in self.store.compare(self.baseline, run_id)}
+
+        index_path = os.path.join(out_dir, 'index.html')
+        with open(index_path, 'w') as index:
+            index.write(self.format_html(self.store.run_info(run_id), rows, figures, verdicts, out_dir,
+                                         self.store.datasets(run_id)))
+        return index_path
+
+    def format_html(self, run_info: dict, rows: list, figures: dict, verdicts: dict, out_dir: str,
+                    datasets: dict = None) -> str:
+        escape = html.escape
+        lines = ['<!DOCTYPE html>', '<html><head><meta charset="utf-8">',
+                 f'<title>Run {escape(run_info["run_id"])}</title>',
+                 '<style>body{font-family:sans-serif}table{border-collapse:collapse}'
+                 'td,th{border:1px solid #ccc;padding:2px 6px;text-align:right}'
+                 'td:first-child{text-align:left}.REGRESSION{background:#fdd}.IMPROVEMENT{background:#dfd}'
+                 '.error{background:#eee}.censored{background:#ffe8c0}</style>',
+                 '</head><body>', f'<h1>Run {escape(run_info["run_id"])}</h1>', '<ul>']
+        for field in ('started_at', 'label', 'git_revision', 'pg_version', 'hardware_fingerprint'):
+            lines.append(f'<li>{field}: {escape(str(run_info[field]))}</li>')
+        lines.append('</ul>')
+        if datasets:
+            lines.append('<h2>Datasets</h2><ul>')
+            for dataset, stats in datasets.items():
+                lines.append(f'<li>{escape(dataset)}: {escape(format_dataset_stats(stats)) if stats else "-"}</li>')
+            lines.append('</ul>')
+
+        headers = ['scenario', 'median ms', 'median 95% CI', 'p95 ms', 'p99 ms', 'stddev ms', 'runs',
+                   'converged', 'join methods', 'planning ms', 'spilled']
+        if verdicts:
+            headers += ['vs baseline', 'p-value']
+        lines.append('<table><tr>' + ''.join(f'<th>{header}</th>' for header in headers) + '</tr>')
+        for row in rows:
+            if row['status'] == 'censored':
+                # Not measured within the time budget; a prediction is the best estimate there is
+                predicted_ms = (row['context'] or {}).get('predicted_ms')
+                median = f"≈ {predicted_ms:.3f} (predicted)" if predicted_ms else "> budget"
+                lines.append(f'<tr class="censored"><td>{escape(row["scenario_key"])}</td><td>{median}</td>'
+                             f'<td colspan="{len(headers) - 2}">censored: {escape(row["error"] or "")}</td></tr>')
+                continue
+            if row['status'] != 'ok':
+                lines.append(f'<tr class="error"><td>{escape(row["scenario_key"])}</td>'
+                             f'<td colspan="{len(headers) - 1}">{escape(row["error"] or row["status"])}</td></tr>')
+                continue
+            summary, plan = row['summary'] or {}, row['plan_summary'] or {}
+            low, high = summary.get('median_ci_ms', (0.0, 0.0))
+            cells = [escape(row['scenario_key']), f"{row['median_ms']:.3f}", f"{low:.3f} – {high:.3f}",
+                     f"{row['p95_ms']:.3f}", f"{row['p99_ms']:.3f}", f"{row['stddev_ms']:.3f}",
+                     str(summary.get('iterations', '')), str(summary.get('converged', '')),
+                     escape(', '.join(plan.get('join_methods', []))),
+                     f"{plan['planning_ms']:.3f}" if plan.get('planning_ms') is not None else '',
+                     escape(', '.join(plan.get('spilled_nodes', [])))]
+            row_class = ''
+            comparison = verdicts.get(row['scenario_key'])
+            if verdicts:
+                if comparison:
+                    cells += [f"{comparison.verdict} {comparison.change:+.1%}", f"{comparison.p_value:.4f}"]
+                    row_class = f' class="{comparison.verdict}"'
+                else:
+                    cells += ['', '']
+            lines.append(f'<tr{row_class}>' + ''.join(f'<td>{cell}</td>' for cell in cells) + '</tr>')
+        lines.append('</table>')
+
+        for group, paths in figures.items():
+            image = next((path for path in paths if path.endswith('.svg')), paths[0])
+            lines.append(f'<h2>{escape(group)}</h2>')
+            lines.append(f'<img src="{escape(os.path.relpath(image, out_dir))}" alt="{escape(group)}">')
+        lines.append('</body></html>')
+        return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Render a stored run to figures and an HTML summary")
+    parser.add_argument("run", nargs="?", default="latest", help="run id, unique prefix, 'latest' or 'previous'")
+    parser.add_argument("--store", default=DEFAULT_PATH)
+    parser.add_argument("--out", help=f"output directory (default: {REPORT_DIR}/<run id>)")
+    parser.add_argument("--formats", nargs="+", choices=FIGURE_FORMATS, default=list(FIGURE_FORMATS))
+    parser.add_argument("--jobs", type=int, help="figures rendered in parallel")
+    parser.add_argument("--baseline", help="mark regressions against this run")
+    args = parser.parse_args()
+
+    builder = ReportBuilder(ResultsStore(args.store), args.out, tuple(args.formats), args.jobs, args.baseline)
+    print(f"Report written to {builder.build(args.run)}")
@@ -0,0 +1,302 @@
+import datetime
+import hashlib
+import json
+import math
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import uuid
+from dataclasses import dataclass
+
+from sqlalchemy import text
+
+from profiler import traced
+
+DEFAULT_PATH = os.path.join('results', 'results.sqlite')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    started_at TEXT NOT NULL,
+    label TEXT,
+    git_revision TEXT,
+    pg_version TEXT,
+    server_settings TEXT,
+    hardware_fingerprint TEXT,
+    hardware TEXT
+);
+CREATE TABLE IF NOT EXISTS measurements (
+    run_id TEXT NOT NULL REFERENCES runs(run_id),
+    scenario_key TEXT NOT NULL,
+    recorded_at TEXT NOT NULL,
+    context TEXT,
+    status TEXT NOT NULL,
+    error TEXT,
+    median_ms REAL,
+    p95_ms REAL,
+    p99_ms REAL,
+    min_ms REAL,
+    stddev_ms REAL,
+    samples_ns TEXT,
+    outliers_ns TEXT,
+    summary TEXT,
+    plan_summary TEXT
+);
+CREATE INDEX IF NOT EXISTS measurements_run ON measurements(run_id, scenario_key);
+CREATE TABLE IF NOT EXISTS datasets (
+    run_id TEXT NOT NULL REFERENCES runs(run_id),
+    dataset TEXT NOT NULL,
+    generator_key TEXT,
+    stats TEXT,
+    PRIMARY KEY (run_id, dataset)
+);
+"""
+
+
+def git_revision() -> str:
+    try:
+        revision = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True,
+                               text=True, check=True).stdout.strip()
+        return revision + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def hardware_info() -> dict:
+    info = {
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'system': platform.system(),
+        'release': platform.release(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+    }
+    try:
+        info['memory_bytes'] = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        info['memory_bytes'] = None
+    if os.path.exists('/proc/cpuinfo'):
+        with open('/proc/cpuinfo') as cpuinfo:
+            model = next((line.split(':', 1)[1].strip() for line in cpuinfo if line.startswith('model name')), None)
+        info['cpu_model'] = model
+    return info
+
+
+def hardware_fingerprint(info: dict) -> str:
+    stable = {key: info.get(key) for key in ('machine', 'system', 'cpu_count', 'memory_bytes', 'cpu_model')}
+    return hashlib.sha1(json.dumps(stable, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+
+def mann_whitney_u(baseline: list, candidate: list) -> float:
+    """Two-sided p-value of the Mann-Whitney U test (normal approximation with tie correction)."""
+    n1, n2 = len(baseline), len(candidate)
+    if n1 == 0 or n2 == 0:
+        return 1.0
+    combined = sorted([(value, 0) for value in baseline] + [(value, 1) for value in candidate])
+    ranks = [0.0] * len(combined)
+    tie_term = 0
+    start = 0
+    while start < len(combined):
+        end = start
+        while end + 1 < len(combined) and combined[end + 1][0] == combined[start][0]:
+            end += 1
+        for position in range(start, end + 1):
+            ranks[position] = (start + end) / 2 + 1
+        tied = end - start + 1
+        tie_term += tied ** 3 - tied
+        start = end + 1
+
+    rank_sum = sum(rank for rank, (_, group) in zip(ranks, combined) if group == 0)
+    u = rank_sum - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    # Continuity correction towards the mean
+    z = (abs(u - n1 * n2 / 2) - 0.5) / math.sqrt(variance)
+    return min(1.0, 2 * (1 - statistics.NormalDist().cdf(max(z, 0.0))))
+
+
+@dataclass
+class Comparison:
+    scenario_key: str
+    baseline_ms: float
+    candidate_ms: float
+    p_value: float
+    verdict: str
+
+    @property
+    def change(self) -> float:
+        return self.candidate_ms / self.baseline_ms - 1 if self.baseline_ms else float('inf')
+
+    def __str__(self):
+        return (f"{self.verdict:<12} {self.change:>+8.1%}  p={self.p_value:.4f}  "
+                f"{self.baseline_ms:>10.3f} -> {self.candidate_ms:>10.3f} ms  {self.scenario_key}")
+
+
+class ResultsStore:
+    """Every measurement of every run, kept in a local SQLite file.
+
+    A run records the environment it was measured in (git revision,
+    PostgreSQL version and non-default settings, hardware fingerprint), and
+    each measurement keeps its full sample distribution so runs can be
+    compared statistically later.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        # Parallel scenario workers share the file, so wait on locks instead of failing
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def start_run(self, engine=None, label: str = None, run_id: str = None) -> str:
+        run_id = run_id or datetime.datetime.now().strftime('%Y%m%d-%H%M%S-') + uuid.uuid4().hex[:6]
+        pg_version, settings = None, {}
+        if engine is not None and engine.dialect.name != 'postgresql':
+            with engine.connect():
+                # The version is known once a connection has been made
+                pg_version = f"{engine.dialect.name} {'.'.join(map(str, engine.dialect.server_version_info or ()))}"
+        elif engine is not None:
+            with engine.connect() as connection:
+                pg_version = connection.execute(text("SELECT version()")).scalar()
+                settings = dict(connection.execute(text(
+                    "SELECT name, setting FROM pg_settings WHERE source NOT IN ('default', 'override')")).all())
+        info = hardware_info()
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR IGNORE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, datetime.datetime.now().isoformat(timespec='seconds'), label, git_revision(),
+                 pg_version, json.dumps(settings, sort_keys=True), hardware_fingerprint(info), json.dumps(info)))
+        return run_id
+
+    @traced('store')
+    def record(self, run_id: str, scenario_key: str, measurement=None, plan=None, context: dict = None,
+               error: str = None, status: str = None):
+        status = status or ('error' if error else 'ok')
+        values = [None] * 9
+        if measurement is not None:
+            values = [measurement.median_ms, measurement.p95_ms, measurement.p99_ms, measurement.min_ms,
+                      measurement.stddev_ms, json.dumps(measurement.samples_ns), json.dumps(measurement.outliers_ns),
+                      json.dumps(measurement.summary()), None]
+        if plan is not None:
+            values[8] = json.dumps(plan.summary())
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO measurements VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, scenario_key, datetime.datetime.now().isoformat(timespec='seconds'),
+                 json.dumps(context or {}, sort_keys=True, default=str), status, error, *values))
+
+    def record_dataset(self, run_id: str, generator, stats: dict):
+        """Keeps the realized statistics of a dataset next to the measurements taken on it."""
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO datasets VALUES (?, ?, ?, ?)",
+                (run_id, generator.label(), json.dumps(generator.cache_key(), sort_keys=True),
+                 json.dumps(stats, sort_keys=True)))
+
+    def datasets(self, run_id: str) -> dict:
+        rows = self.connection.execute("SELECT dataset, stats FROM datasets WHERE run_id = ? ORDER BY dataset",
+                                       (run_id,))
+        return {dataset: json.loads(stats) if stats else None for dataset, stats in rows}
+
+    def runs(self) -> list:
+        return self.connection.execute(
+            "SELECT r.run_id, r.started_at, r.label, r.git_revision, r.hardware_fingerprint, count(m.run_id) "
+            "FROM runs r LEFT JOIN measurements m USING (run_id) GROUP BY r.run_id ORDER BY r.started_at").fetchall()
+
+    def resolve(self, run_id: str) -> str:
+        """Accepts a run id, a unique prefix of one, or 'latest' / 'previous'."""
+        run_ids = [row[0] for row in self.runs()]
+        if run_id in ('latest', 'previous'):
+            offset = 1 if run_id == 'latest' else 2
+            if len(run_ids) < offset:
+                raise ValueError(f"Not enough runs recorded for {run_id!r}")
+            return run_ids[-offset]
+        matches = [candidate for candidate in run_ids if candidate.startswith(run_id)]
+        if len(matches) != 1:
+            raise ValueError(f"Run {run_id!r} matches {len(matches)} runs")
+        return matches[0]
+
+    def run_info(self, run_id: str) -> dict:
+        cursor = self.connection.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,))
+        columns = [column[0] for column in cursor.description]
+        row = cursor.fetchone()
+        return dict(zip(columns, row)) if row else None
+
+    def measurements(self, run_id: str) -> list:
+        """All measurements of a run as dicts, with the JSON columns decoded."""
+        cursor = self.connection.execute("SELECT * FROM measurements WHERE run_id = ? ORDER BY rowid", (run_id,))
+        columns = [column[0] for column in cursor.description]
+        rows = []
+        for values in cursor:
+            row = dict(zip(columns, values))
+            for column in ('context', 'samples_ns', 'outliers_ns', 'summary', 'plan_summary'):
+                row[column] = json.loads(row[column]) if row[column] is not None else None
+            rows.append(row)
+        return rows
+
+    def samples(self, run_id: str) -> dict:
+        """Latest successful sample distribution per scenario for a run, in milliseconds."""
+        rows = self.connection.execute(
+            "SELECT scenario_key, samples_ns FROM measurements WHERE run_id = ? AND status = 'ok' "
+            "ORDER BY recorded_at", (run_id,))
+        return {key: [sample / 1e6 for sample in json.loads(samples)] for key, samples in rows}
+
+    def compare(self, baseline: str, candidate: str, alpha: float = 0.01, min_effect: float = 0.05) -> list:
+        """Flags scenarios whose timing distribution moved significantly and by at least min_effect."""
+        baseline_samples = self.samples(self.resolve(baseline))
+        candidate_samples = self.samples(self.resolve(candidate))
+        comparisons = []
+        for key in sorted(baseline_samples.keys() & candidate_samples.keys()):
+            before, after = baseline_samples[key], candidate_samples[key]
+            p_value = mann_whitney_u(before, after)
+            baseline_ms, candidate_ms = statistics.median(before), statistics.median(after)
+            change = candidate_ms / baseline_ms - 1 if baseline_ms else 0.0
+            if p_value < alpha and abs(change) >= min_effect:
+                verdict = 'REGRESSION' if change > 0 else 'IMPROVEMENT'
+            else:
+                verdict = 'unchanged'
+            comparisons.append(Comparison(key, baseline_ms, candidate_ms, p_value, verdict))
+        return comparisons
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Inspect stored runs and compare them")
+    parser.add_argument("--path", default=DEFAULT_PATH)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("runs", help="list recorded runs")
+    compare_parser = subparsers.add_parser("compare", help="flag significant changes against a baseline run")
+    compare_parser.add_argument("baseline", help="run id, unique prefix, 'latest' or 'previous'")
+    compare_parser.add_argument("candidate", nargs="?", default="latest")
+    compare_parser.add_argument("--alpha", type=float, default=0.01, help="significance level")
+    compare_parser.add_argument("--min-effect", type=float, default=0.05,
+                                help="smallest relative change of the median worth flagging")
+    compare_parser.add_argument("--all", action="store_true", help="also list unchanged scenarios")
+    args = parser.parse_args()
+
+    store = ResultsStore(args.path)
+    if args.command == "runs":
+        for run_id, started_at, label, revision, fingerprint, count in store.runs():
+            print(f"{run_id}  {started_at}  {count:>5} measurements  git {revision}  hw {fingerprint}  {label or ''}")
+    else:
+        comparisons = store.compare(args.baseline, args.candidate, args.alpha, args.min_effect)
+        for comparison in comparisons:
+            if args.all or comparison.verdict != 'unchanged':
+                print(comparison)
+        regressions = sum(comparison.verdict == 'REGRESSION' for comparison in comparisons)
+        improvements = sum(comparison.verdict == 'IMPROVEMENT' for comparison in comparisons)
+        print(f"{len(comparisons)} scenarios compared: {regressions} regressions, {improvements} improvements")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,67 @@
+from dataclasses import dataclass
+
+from queries import JOIN_QUERIES
+
+
+@dataclass(frozen=True)
+class Rewrite:
+    name: str
+    sql: str
+    # DDL the rewrite relies on, run before it is measured and undone afterwards
+    setup: tuple = ()
+    teardown: tuple = ()
+    # Conditions on the data under which the rewrite returns the same rows as the original
+    assumes: str = None
+
+
+# Every rewrite projects e.*, d.* in that order, so its rows compare directly with SELECT * of the original
+REWRITES = {
+    'like': [
+        # department_id's text starts with dept_id's text exactly when dividing it by 10^k gives dept_id
+        # for some k below its digit count, which turns the prefix match into a hashable equi-join
+        Rewrite('divisor equi-join', """
+            SELECT e.*, d.* FROM employees e
+            CROSS JOIN LATERAL generate_series(0, length(abs(e.department_id)::TEXT) - 1) AS g(k)
+            JOIN departments d ON e.department_id / (10 ^ g.k)::BIGINT = d.dept_id
+        """, assumes="dept_id <> 0"),
+        # The same prefix match as one integer range per number of trailing digits, served by a B-tree
+        Rewrite('integer range', """
+            SELECT e.*, d.* FROM departments d
+            CROSS JOIN LATERAL generate_series(0, 9) AS g(k)
+            JOIN employees e ON e.department_id BETWEEN d.dept_id * (10 ^ g.k)::BIGINT
+                                                    AND (d.dept_id + 1) * (10 ^ g.k)::BIGINT - 1
+        """, setup=("CREATE INDEX idx_rewrite_employees_department_id ON employees (department_id)",),
+                teardown=("DROP INDEX IF EXISTS idx_rewrite_employees_department_id",),
+                assumes="dept_id > 0 and department_id > 0"),
+    ],
+    'between': [
+        # Each employee matches the departments 0..10 below its department_id
+        Rewrite('offset equi-join', """
+            SELECT e.*, d.* FROM employees e
+            CROSS JOIN LATERAL generate_series(0, 10) AS g(k)
+            JOIN departments d ON d.dept_id = e.department_id - g.k
+        """),
+        Rewrite('range type + GiST', """
+            SELECT e.*, d.* FROM employees e
+            JOIN departments d ON int4range(d.dept_id, d.dept_id + 10, '[]') @> e.department_id
+        """, setup=("CREATE INDEX idx_rewrite_departments_range ON departments "
+                    "USING gist (int4range(dept_id, dept_id + 10, '[]'))",),
+                teardown=("DROP INDEX IF EXISTS idx_rewrite_departments_range",)),
+        Rewrite('B-tree range probe', """
+            SELECT e.*, d.* FROM departments d
+            JOIN employees e ON e.department_id BETWEEN d.dept_id AND d.dept_id + 10
+        """, setup=("CREATE INDEX idx_rewrite_employees_department_id ON employees (department_id)",),
+                teardown=("DROP INDEX IF EXISTS idx_rewrite_employees_department_id",)),
+    ],
+}
+
+
+def original(query_key: str) -> Rewrite:
+    name, sql = JOIN_QUERIES[query_key]
+    return Rewrite(f"original ({name})", sql)
+
+
+def difference_query(original_sql: str, rewrite_sql: str) -> str:
+    """Rows that appear a different number of times in the two results, counted on the server."""
+    return (f"SELECT (SELECT count(*) FROM (({original_sql}) EXCEPT ALL ({rewrite_sql})) AS missing), "
+            f"(SELECT count(*) FROM (({rewrite_sql}) EXCEPT ALL ({original_sql})) AS extra)")
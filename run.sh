@@ -1,2 +1,3 @@
-# run postgres db
-docker run --name postgres -e POSTGRES_PASSWORD=postgres -d -p 5432:5432 postgres
+# run postgres db; pg_stat_statements lets measurements attribute planning and execution time per query
+docker run --name postgres -e POSTGRES_PASSWORD=postgres -d -p 5432:5432 postgres \
+    -c shared_preload_libraries=pg_stat_statements -c pg_stat_statements.track_planning=on
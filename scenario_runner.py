@@ -0,0 +1,153 @@
+import multiprocessing
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stdout
+from dataclasses import dataclass
+
+from backends import backend_for
+from budget import RuntimeBudget
+from data_generator import DataGenerator, Distribution
+from fingerprint import ResultVerifier
+from results_store import ResultsStore
+
+LOG_DIR = os.path.join('results', 'logs')
+FIGURE_DIR = os.path.join('results', 'figures')
+
+
+@dataclass(frozen=True)
+class Scenario:
+    test_name: str
+    num_employees: int
+    num_departments: int
+    seed: int = 42
+    distribution: Distribution = Distribution()
+
+    @property
+    def key(self) -> str:
+        key = f"{self.test_name}_{self.num_employees}_{self.num_departments}_{self.seed}"
+        return key if not self.distribution.changes() else f"{key}_{self.distribution.label()}"
+
+
+@dataclass
+class ScenarioOutcome:
+    scenario: Scenario
+    seconds: float
+    log_path: str
+    error: str = None
+    verifier: ResultVerifier = None
+    # Why the scenario's test can't run on the backend, when it was skipped
+    skipped: str = None
+
+
+def test_classes() -> dict:
+    from concurrent_load_test import ConcurrentLoadTest
+    from index_explorer_test import IndexExplorerTest
+    from join_between_test import JoinBetweenTest
+    from join_index_test import JoinIndexTest
+    from join_like_test import JoinLikeTest
+    from join_method_test import JoinMethodTest
+    from join_rewrite_test import JoinRewriteTest
+    from partition_test import PartitionTest
+    from prepared_statement_test import PreparedStatementTest
+    return {test_class.__name__: test_class for test_class in
+            (JoinMethodTest, JoinIndexTest, JoinLikeTest, JoinBetweenTest, ConcurrentLoadTest,
+             IndexExplorerTest, JoinRewriteTest, PreparedStatementTest, PartitionTest)}
+
+
+def _init_worker():
+    # Workers have no display; figures are saved to files, and pyplot must not pick an interactive backend
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def run_scenario(scenario: Scenario, db_url: str, timing_lock=None, store_path: str = None,
+                 run_id: str = None, verify: bool = False, budget_seconds: float = None) -> ScenarioOutcome:
+    """Runs one scenario in its own cloned database, writing its output to a log file."""
+    os.makedirs(LOG_DIR, exist_ok=True)
+    log_path = os.path.join(LOG_DIR, f"{scenario.key}.log")
+    start_time = time.perf_counter()
+    error = None
+    verifier = ResultVerifier() if verify else None
+    backend = backend_for(db_url)
+    test_class = test_classes()[scenario.test_name]
+    skipped = test_class.unsupported(backend)
+    if skipped is not None:
+        return ScenarioOutcome(scenario, 0.0, None, skipped=skipped)
+    with open(log_path, 'w') as log, redirect_stdout(log):
+        try:
+            fixture_cache = backend.fixture_cache()
+            generator = DataGenerator(scenario.num_employees, scenario.num_departments, seed=scenario.seed,
+                                      distribution=scenario.distribution)
+            with fixture_cache.clone(generator) as clone_url:
+                test = test_class(clone_url, scenario.num_employees, scenario.num_departments, preloaded=True)
+                # Workers have no display, so figures always go to files
+                test.figure_dir = FIGURE_DIR
+                if timing_lock is not None:
+                    test.timing_lock = timing_lock
+                if store_path is not None:
+                    test.results_store, test.run_id = ResultsStore(store_path), run_id
+                    test.results_store.record_dataset(run_id, generator, fixture_cache.stats(generator, clone_url))
+                test.verifier = verifier
+                if budget_seconds is not None:
+                    # Workers share no history, so only the scenario's own deadline applies
+                    test.budget = RuntimeBudget(budget_seconds).scenario()
+                test.execute()
+            if verifier is not None:
+                print(verifier.report())
+        except Exception:
+            error = traceback.format_exc()
+            print(error)
+    return ScenarioOutcome(scenario, time.perf_counter() - start_time, log_path, error, verifier)
+
+
+class ScenarioRunner:
+    """Runs independent scenarios in a process pool, each against its own database.
+
+    With quiet=True, the timed section of every test runs under one
+    cross-process lock. Data generation, loading and cloning still overlap,
+    but no two measurements run at the same time.
+
+    With a verifier, each worker fingerprints its scenario's results and
+    the verifier gathers what they found. With a budget, every scenario
+    gets budget.scenario_seconds; sizes are spread over the workers, so
+    nothing is predicted from smaller ones. Scenarios whose test can't run
+    on the backend are skipped with the reason.
+    """
+
+    def __init__(self, db_url: str, max_workers: int = None, quiet: bool = False, results_store: ResultsStore = None,
+                 run_id: str = None, verifier: ResultVerifier = None, budget: RuntimeBudget = None):
+        self.db_url = db_url
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.quiet = quiet
+        self.results_store = results_store
+        self.run_id = run_id
+        self.verifier = verifier
+        self.budget = budget
+
+    def run(self, scenarios: list) -> list:
+        outcomes = []
+        with multiprocessing.Manager() as manager:
+            timing_lock = manager.Lock() if self.quiet else None
+            with ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker) as executor:
+                # Workers open their own handle on the store file
+                store_path = self.results_store.path if self.results_store is not None else None
+                futures = [executor.submit(run_scenario, scenario, self.db_url, timing_lock, store_path, self.run_id,
+                                           self.verifier is not None,
+                                           self.budget.scenario_seconds if self.budget is not None else None)
+                           for scenario in scenarios]
+                for future in as_completed(futures):
+                    outcome = future.result()
+                    if outcome.skipped is not None:
+                        print(f"{outcome.scenario.key}: skipped, {outcome.skipped}")
+                        outcomes.append(outcome)
+                        continue
+                    status = "failed" if outcome.error else "done"
+                    if outcome.verifier is not None:
+                        self.verifier.merge(outcome.verifier)
+                        if outcome.verifier.mismatches:
+                            status += f" with {len(outcome.verifier.mismatches)} result mismatches"
+                    print(f"{outcome.scenario.key}: {status} in {outcome.seconds:.1f} s (log: {outcome.log_path})")
+                    outcomes.append(outcome)
+        return outcomes
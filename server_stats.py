@@ -0,0 +1,116 @@
+from sqlalchemy import text
+
+# Leads every statement the collector runs, so pg_stat_statements deltas can leave them out
+MARKER = "/* server_stats */"
+
+STATEMENT_COUNTERS = ('calls', 'total_plan_time', 'total_exec_time', 'shared_blks_hit', 'shared_blks_read',
+                      'temp_blks_read', 'temp_blks_written', 'wal_bytes')
+DATABASE_COUNTERS = ('blks_hit', 'blks_read', 'temp_files', 'temp_bytes', 'tup_returned', 'tup_fetched')
+IO_COUNTERS = ('reads', 'hits', 'writes', 'extends', 'evictions')
+
+STATEMENTS_SNAPSHOT = f"""{MARKER}
+SELECT queryid, {', '.join(STATEMENT_COUNTERS)} FROM pg_stat_statements
+WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+  AND query NOT LIKE '{MARKER}%' AND query !~* '^\\s*(BEGIN|COMMIT|ROLLBACK)'
+"""
+
+DATABASE_SNAPSHOT = f"""{MARKER}
+SELECT {', '.join(DATABASE_COUNTERS)} FROM pg_stat_database WHERE datname = current_database()
+"""
+
+# Cluster-wide, like the WAL position; pg_stat_io only exists from PostgreSQL 16 on
+IO_SNAPSHOT = f"""{MARKER}
+SELECT {', '.join(f'coalesce(sum({counter}), 0) AS {counter}' for counter in IO_COUNTERS)}
+FROM pg_stat_io WHERE backend_type = 'client backend'
+"""
+
+
+def lsn_bytes(lsn: str) -> int:
+    high, low = lsn.split('/')
+    return (int(high, 16) << 32) + int(low, 16)
+
+
+class ServerStatsCollector:
+    """Snapshots server-side counters so the cost of a batch of queries can be taken as a difference.
+
+    Sources that the server does not offer are skipped: pg_stat_statements
+    needs the library in shared_preload_libraries, pg_stat_io needs
+    PostgreSQL 16, and forcing our own backend to publish its pending
+    counters right away needs PostgreSQL 15.
+    """
+
+    def __init__(self, connection):
+        version = int(connection.execute(text(f"{MARKER} SHOW server_version_num")).scalar())
+        preloaded = connection.execute(text(f"{MARKER} SHOW shared_preload_libraries")).scalar()
+        self.sources = ['database', 'wal']
+        if 'pg_stat_statements' in preloaded:
+            connection.execute(text(f"{MARKER} CREATE EXTENSION IF NOT EXISTS pg_stat_statements"))
+            connection.commit()
+            self.sources.append('statements')
+        if version >= 160000:
+            self.sources.append('io')
+        self.force_flush = version >= 150000
+
+    def snapshot(self, connection) -> dict:
+        if self.force_flush:
+            connection.execute(text(f"{MARKER} SELECT pg_stat_force_next_flush()"))
+        # A backend publishes its counters only when it goes idle outside a transaction, and a
+        # transaction keeps reading the statistics it saw first
+        connection.commit()
+        snapshot = {'database': dict(connection.execute(text(DATABASE_SNAPSHOT)).one()._mapping),
+                    'wal': {'bytes': lsn_bytes(connection.execute(text(f"{MARKER} SELECT pg_current_wal_lsn()"))
+                                               .scalar())}}
+        if 'statements' in self.sources:
+            snapshot['statements'] = {row.queryid: dict(row._mapping)
+                                      for row in connection.execute(text(STATEMENTS_SNAPSHOT))}
+        if 'io' in self.sources:
+            snapshot['io'] = dict(connection.execute(text(IO_SNAPSHOT)).one()._mapping)
+        connection.commit()
+        return snapshot
+
+    def delta(self, before: dict, after: dict, iterations: int) -> dict:
+        delta = {'iterations': iterations, 'sources': list(self.sources)}
+        for source in ('database', 'wal', 'io'):
+            if source in after:
+                delta[source] = {name: float(value - before[source][name]) for name, value in after[source].items()}
+        if 'statements' in after:
+            totals = dict.fromkeys(STATEMENT_COUNTERS, 0.0)
+            for queryid, counters in after['statements'].items():
+                previous = before['statements'].get(queryid, {})
+                if counters['calls'] == previous.get('calls', 0):
+                    continue
+                for name in STATEMENT_COUNTERS:
+                    totals[name] += float(counters[name] - previous.get(name, 0))
+            delta['statements'] = totals
+        return delta
+
+
+def bottleneck(delta: dict) -> str:
+    """Where the time most likely went: spilling to temp files, reading blocks in, or buffer cache hits."""
+    statements = delta.get('statements')
+    if statements and statements['calls']:
+        temp, reads = statements['temp_blks_written'], statements['shared_blks_read']
+    else:
+        temp, reads = delta['database']['temp_bytes'], delta['database']['blks_read']
+    if temp > 0:
+        return 'temp spill'
+    # Reads missed shared_buffers, though the OS page cache may still have served them
+    if reads > 0:
+        return 'block reads'
+    return 'cache hits'
+
+
+def format_server_stats(delta: dict) -> str:
+    iterations = max(delta['iterations'], 1)
+    database = delta['database']
+    blocks = database['blks_hit'] + database['blks_read']
+    parts = [bottleneck(delta),
+             f"hit {database['blks_hit'] / blocks if blocks else 1.0:.1%}",
+             f"read {database['blks_read'] / iterations:.0f} blks/run",
+             f"temp {database['temp_bytes'] / iterations / 2 ** 20:.1f} MiB/run",
+             f"WAL {delta['wal']['bytes'] / iterations / 1024:.1f} KiB/run"]
+    statements = delta.get('statements')
+    if statements and statements['calls']:
+        parts.append(f"plan {statements['total_plan_time'] / statements['calls']:.3f} ms "
+                     f"exec {statements['total_exec_time'] / statements['calls']:.3f} ms/call")
+    return ", ".join(parts)